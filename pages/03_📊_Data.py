@@ -1,13 +1,18 @@
 import os
-import sqlite3
 import streamlit as st
-from io import BytesIO
 import pandas as pd
-import time
 import base64
 from sklearn.impute import SimpleImputer
 from utils.login import invoke_login_widget
 from utils.lottie import display_lottie_on_page
+from utils.datasets import load_template_dataset, to_numeric_or_keep
+from utils.schema import apply_schema
+from utils.readers import read_upload
+from utils.filters import FilterIndex
+from utils.profiling import profile_dataset
+from utils.exports import EXPORT_FORMATS, export_bytes
+from utils.user_db import get_user_database, user_db_path
+from utils.ingestion import get_ingestion_job, submit_ingestion, upload_sha256
 
 # Invoke the login form
 invoke_login_widget('Data Overview')
@@ -35,19 +40,14 @@ if st.session_state.get("authentication_status"):
                 Start by exploring a template dataset or uploading yours. Detailed column descriptions 
                 are provided to help you understand the structure and content required for your dataset. 
                 Additionally, you can interactively filter the data and review a summary of the displayed dataset.
-                Download options are provided in Excel, Stata, HTML, and JSON formats for professional data handling and analysis.
+                Download options are provided in Excel, Stata, HTML, JSON, Parquet and gzipped CSV formats for professional data handling and analysis.
                 """
             )
         with right_column:
             display_lottie_on_page("Data Overview")
 
-    # Load the initial data from a local file
-    @st.cache_data(persist=True, show_spinner=False)
-    def load_initial_data():
-        df = pd.read_csv('./data/LP2_train_final.csv')
-        return df
-    
-    initial_df = load_initial_data()
+    # Load the initial data from the typed columnar cache of the template file
+    initial_df = load_template_dataset()
     
     st.sidebar.header("Data Upload")
     uploaded_file = st.sidebar.file_uploader("Upload your CSV or Excel file", type=["csv", "xlsx"])
@@ -56,210 +56,147 @@ if st.session_state.get("authentication_status"):
     def load_uploaded_data(file):
         if file is not None:
             try:
-                if file.name.endswith(".csv"):
-                    df = pd.read_csv(file)
-                elif file.name.endswith(".xlsx"):
-                    df = pd.read_excel(file)
+                # Excel files go through the fastest available engine
+                df = read_upload(file)
                 return df
             except Exception as e:
                 st.error(f"Error: {e}")
                 return None
         return None
     
-    # Function to save the uploaded file with a unique name
-    def save_uploaded_file(file, username):
+    # Hash each uploaded file once, reruns reuse the hash kept in the session
+    def uploaded_file_sha256(file):
+        upload_hash = st.session_state.get('upload_hash')
+        if upload_hash is None or upload_hash[0] != file.file_id:
+            upload_hash = (file.file_id, upload_sha256(file))
+            st.session_state['upload_hash'] = upload_hash
+        return upload_hash[1]
+
+    # Function to save the uploaded file under its content hash, identical files are stored once
+    def save_uploaded_file(file, username, content_hash):
         # Ensure the directory exists
         save_dir = f"./data/{username}"
         os.makedirs(save_dir, exist_ok=True)
 
-        # Determine the next file number
-        existing_files = os.listdir(save_dir)
-        file_count = len(existing_files) + 1
-
-        # Save the file
+        # Save the file unless the same contents were uploaded before
         file_extension = 'csv' if file.name.endswith('.csv') else 'xlsx'
-        save_path = os.path.join(save_dir, f"{username}_file{file_count}.{file_extension}")
-        with open(save_path, "wb") as f:
-            f.write(file.getbuffer())
+        save_path = os.path.join(save_dir, f"{username}_{content_hash[:16]}.{file_extension}")
+        if not os.path.exists(save_path):
+            with open(save_path, "wb") as f:
+                f.write(file.getbuffer())
 
         return save_path
     
-    def validate_data_structure(uploaded_df, template_df):
-        # Compare column names
-        if list(uploaded_df.columns) != list(template_df.columns):
-            return False
-        
-        # Compare data types
-        if uploaded_df.dtypes.tolist() != template_df.dtypes.tolist():
-            return False
-        
-        return True
-    
-    def save_uploaded_file_as_sqlite(file, username):
-        # Ensure the directory exists
-        save_dir = f"./data/{username}"
-        os.makedirs(save_dir, exist_ok=True)
-
-        # Define the path for the user's SQLite database
-        db_path = os.path.join(save_dir, f"{username}.db")
-
-        # Connect to the SQLite database (it will be created if it doesn't exist)
-        conn = sqlite3.connect(db_path)
-
-        # Get existing tables and determine the next table number
-        existing_tables_query = "SELECT name FROM sqlite_master WHERE type='table';"
-        existing_tables = [table[0] for table in conn.execute(existing_tables_query).fetchall()]
-        
-        # Filter tables to find those that match the user's naming pattern
-        user_tables = [table for table in existing_tables if table.startswith(f"{username}_table")]
-
-        if user_tables:
-            # Extract the numeric part, convert to integer, and find the max value
-            max_table_num = max([int(table.split(f"{username}_table")[1]) for table in user_tables])
-            next_table_num = max_table_num + 1
+    def show_template_mismatch_error():
+        st.error("""The structure of the uploaded file does not align with the expected template. 
+                 Please review the column descriptions provided below to ensure that the column 
+                 names and data types conform to the required specifications.
+                 """)
+
+    def save_uploaded_file_as_sqlite(file, username, content_hash):
+        # Define the path for the user's SQLite database, connections to it are pooled
+        db_path = user_db_path(username)
+
+        # A file uploaded before reuses its table, or its earlier rejection, without being parsed again
+        previous_upload = get_user_database(db_path).find_dataset(content_hash)
+        if previous_upload is not None:
+            dataset_id, table_name = previous_upload
+            if table_name is None:
+                show_template_mismatch_error()
+            return dataset_id, table_name, db_path, None
+
+        # New files are streamed into a new table by the background workers, each chunk is checked
+        # against the template structure. Each upload is submitted once, reruns poll the job kept in
+        # the session, and uploading the file again retries a failed job
+        upload_job = st.session_state.get('upload_job')
+        job = None
+        if upload_job is not None and upload_job[0] == file.file_id:
+            job = get_ingestion_job(upload_job[1])
+        if job is None:
+            job_id = submit_ingestion(file.getvalue(), file.name, db_path, username, initial_df, content_hash)
+            st.session_state['upload_job'] = (file.file_id, job_id)
+            job = get_ingestion_job(job_id)
+
+        if job['state'] == 'done':
+            return job['dataset_id'], job['table_name'], db_path, job
+        if job['state'] == 'rejected':
+            show_template_mismatch_error()
+        elif job['state'] == 'failed':
+            st.error(f"The uploaded file could not be processed: {job['error']}")
+        return None, None, db_path, job
+
+    # Poll the background ingestion and rerun the page once the new dataset is ready
+    @st.fragment(run_every=1)
+    def show_ingestion_progress(job_id):
+        job = get_ingestion_job(job_id)
+        if job is not None and job['state'] in ('queued', 'running'):
+            st.progress(job['progress'], text=f"Processing upload... {job['rows']:,} rows")
         else:
-            next_table_num = 1
-
-        # Determine the required padding based on the number of digits in next_table_num
-        # Pad the table number with leading zeros based on the length of the highest table number
-        pad_length = len(str(next_table_num))
-        table_name = f"{username}_table{str(next_table_num).zfill(pad_length)}"
-
-        # Save the DataFrame to the new table in the SQLite database
-        try:
-            file.seek(0)  # Reset file pointer to the start
-            if file.name.endswith('.csv'):
-                df = pd.read_csv(file)
-            elif file.name.endswith('.xlsx'):
-                df = pd.read_excel(file)
-
-            if df is None or df.empty:
-                st.error("The uploaded file is empty or improperly formatted. Please upload a valid file.")
-                return None, None, None
-
-            # Check if the uploaded data structure matches the template structure
-            if not validate_data_structure(df, initial_df):
-                st.error("""The structure of the uploaded file does not align with the expected template. 
-                         Please review the column descriptions provided below to ensure that the column 
-                         names and data types conform to the required specifications.
-                         """)
-                return None, None, None
-
-            df.to_sql(table_name, conn, index=False, if_exists='replace')
-
-        except Exception as e:
-            st.error(f"An unexpected error occurred: {e}")
-            return None, None, None
-        finally:
-            conn.close()
-
-        return df, table_name, db_path
-    
-    def generate_download_buttons_original(df):
-        col1, col2, col3, col4 = st.columns(4)
-
-        with col1:
-            # Download as Excel
-            excel_buffer = BytesIO()
-            with pd.ExcelWriter(excel_buffer, engine='xlsxwriter') as writer:
-                df.to_excel(writer, index=False, sheet_name='Sheet1')
-            st.download_button(
-                label="Download as Excel",
-                data=excel_buffer.getvalue(),
-                file_name="data.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                key="original_excel"
-            )
+            st.rerun()
+
+    # Filter indexes are shared by every session showing the same dataset
+    @st.cache_resource(show_spinner=False, max_entries=4)
+    def get_filter_index(dataset_key, _df):
+        return FilterIndex(_df)
+
+    # Summary tables for a dataset, or one filtered view of it
+    @st.cache_data(show_spinner=False, max_entries=32)
+    def load_profile(dataset_key, filter_state, _df):
+        return profile_dataset(_df)
+
+    # The coerced, indexed, imputed and typed frame, prepared once per dataset like the Dashboard's.
+    # Returns the frame and the columns whose text had to be coerced to numbers
+    @st.cache_data(show_spinner=False, max_entries=4)
+    def load_prepared_dataset(dataset_key, check_numbers, _df):
+        df = _df
+        coerced_columns = []
+        if check_numbers:
+            # Define the list of specific columns to check and coerce
+            columns_to_coerce = ['Tenure', 'MonthlyCharges', 'TotalCharges', 'AvgMonthlyCharges', 'MonthlyChargesToTotalChargesRatio']
+            df = df.apply(to_numeric_or_keep)
+            # Ensure numerical columns are correctly typed for specific columns
+            for column in columns_to_coerce:
+                if column in df.columns and df[column].dtype == 'object':
+                    df[column] = pd.to_numeric(df[column], errors='coerce')
+                    coerced_columns.append(column)
 
-        with col2:
-            # Download as Stata
-            stata_buffer = BytesIO()
-            df.to_stata(stata_buffer, write_index=False)
-            st.download_button(
-                label="Download as Stata",
-                data=stata_buffer.getvalue(),
-                file_name="data.dta",
-                mime="application/x-stata",
-                key="original_stata"
-            )
+        # Ensure 'customer_id' is set as the index
+        df = df.set_index('customerID')
 
-        with col3:
-            # Download as HTML
-            html = df.to_html(index=False).encode('utf-8')
-            st.download_button(
-                label="Download as HTML",
-                data=html,
-                file_name="data.html",
-                mime="text/html",
-                key="original_html"
-            )
+        # Handle missing values
+        numerical_columns = df.select_dtypes(include=['float32', 'float64', 'int64']).columns.tolist()
+        numerical_imputer = SimpleImputer(strategy='median')
+        df[numerical_columns] = numerical_imputer.fit_transform(df[numerical_columns])
 
-        with col4:
-            # Download as JSON
-            json = df.to_json(orient="records").encode('utf-8')
-            st.download_button(
-                label="Download as JSON",
-                data=json,
-                file_name="data.json",
-                mime="application/json",
-                key="original_json"
-            )
+        # Hold the template columns in their declared compact dtypes, numbers were already parsed above
+        return apply_schema(df), coerced_columns
 
+    # Read an ingested upload back from the user's SQLite database
+    @st.cache_data(show_spinner=False, max_entries=4)
+    def load_ingested_table(db_path, table_name):
+        return get_user_database(db_path).read_table(table_name)
     
-    def generate_download_buttons_filtered(df):
-        col1, col2, col3, col4 = st.columns(4)
-
-        with col1:
-            # Download as Excel
-            excel_buffer = BytesIO()
-            with pd.ExcelWriter(excel_buffer, engine='xlsxwriter') as writer:
-                df.to_excel(writer, index=False, sheet_name='Sheet1')
-            st.download_button(
-                label="Download as Excel",
-                data=excel_buffer.getvalue(),
-                file_name="data.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                key="filtered_excel"
-            )
-
-        with col2:
-            # Download as Stata
-            stata_buffer = BytesIO()
-            df.to_stata(stata_buffer, write_index=False)
-            st.download_button(
-                label="Download as Stata",
-                data=stata_buffer.getvalue(),
-                file_name="data.dta",
-                mime="application/x-stata",
-                key="filtered_stata"
-            )
-
-        with col3:
-            # Download as HTML
-            html = df.to_html(index=False).encode('utf-8')
-            st.download_button(
-                label="Download as HTML",
-                data=html,
-                file_name="data.html",
-                mime="text/html",
-                key="filtered_html"
-            )
-
-        with col4:
-            # Download as JSON
-            json = df.to_json(orient="records").encode('utf-8')
-            st.download_button(
-                label="Download as JSON",
-                data=json,
-                file_name="data.json",
-                mime="application/json",
-                key="filtered_json"
-            )
+    def generate_download_buttons(df, key_prefix, cache_key):
+        # Files are generated only when a button is clicked, on a separate thread from the
+        # script run, and cached by dataset and filter state for repeated downloads
+        columns = st.columns(len(EXPORT_FORMATS))
+
+        for column, (export_format, (label, file_name, mime, _)) in zip(columns, EXPORT_FORMATS.items()):
+            with column:
+                st.download_button(
+                    label=label,
+                    data=lambda export_format=export_format: export_bytes(df, export_format, cache_key),
+                    file_name=file_name,
+                    mime=mime,
+                    key=f"{key_prefix}_{export_format}",
+                    on_click="ignore"
+                )
 
 
-    # Load data from the uploaded file or use the initial data
-    uploaded_df = load_uploaded_data(uploaded_file)
-    df = uploaded_df if uploaded_df is not None else initial_df
+    # Use the initial data until an uploaded dataset has been ingested
+    df = initial_df
+    # Identifies the displayed dataset for the cached filter indexes
+    dataset_key = ('template',)
 
     # Check if the dataset is the initial one or an uploaded one
     if uploaded_file is None:
@@ -282,58 +219,59 @@ if st.session_state.get("authentication_status"):
             """
         )
 
-        # Save the uploaded dataset
-        save_path = save_uploaded_file(uploaded_file, username)
-        sqldf, table_name, db_path = save_uploaded_file_as_sqlite(uploaded_file, username)
+        # Save the uploaded dataset and hand it to the ingestion worker. Both are keyed by the
+        # content hash, so reruns and repeated uploads of the same file are no-ops
+        content_hash = uploaded_file_sha256(uploaded_file)
+        save_path = save_uploaded_file(uploaded_file, username, content_hash)
+        dataset_id, table_name, db_path, job = save_uploaded_file_as_sqlite(uploaded_file, username, content_hash)
+
+        if table_name is not None:
+            df = load_ingested_table(db_path, table_name)
+            dataset_key = (db_path, dataset_id)
+            st.session_state['last_ingested_upload'] = (db_path, dataset_id, table_name)
+
+            # Confirm the upload once, without holding up the script run, and make it the
+            # dataset the dashboard shows
+            if st.session_state.get('confirmed_upload') != content_hash:
+                st.session_state['confirmed_upload'] = content_hash
+                get_user_database(db_path).activate_dataset(dataset_id)
+                st.toast("File successfully uploaded!")
+        elif job is not None and job['state'] in ('queued', 'running'):
+            # Keep showing the previously uploaded dataset, or the template, until the new one is ready
+            last_upload = st.session_state.get('last_ingested_upload')
+            if last_upload is not None:
+                last_db_path, last_dataset_id, last_table_name = last_upload
+                df = load_ingested_table(last_db_path, last_table_name)
+                dataset_key = (last_db_path, last_dataset_id)
+            with st.sidebar:
+                show_ingestion_progress(job['id'])
+        else:
+            # Files that do not match the template can still be explored, they are parsed in full
+            uploaded_df = load_uploaded_data(uploaded_file)
+            if uploaded_df is not None:
+                df = uploaded_df
+                dataset_key = ('upload', content_hash)
 
         # Generate download buttons for different file formats
         # generate_download_buttons_original(sqldf)
 
-        # Create a sidebar placeholder for the success message
-        success_placeholder = st.sidebar.empty()
-
-        # Show the success message
-        success_placeholder.success(f"File successfully uploaded!")
-
-        # Use a time delay to clear the message after 3 seconds
-        time.sleep(3)
-
-        # Clear the success message
-        success_placeholder.empty()
-
-        # Define the list of specific columns to check and coerce
-        columns_to_coerce = ['Tenure', 'MonthlyCharges', 'TotalCharges', 'AvgMonthlyCharges', 'MonthlyChargesToTotalChargesRatio']
-
-        try:
-            df = df.apply(pd.to_numeric, errors='ignore') 
-            # Ensure numerical columns are correctly typed for specific columns
-            for column in columns_to_coerce:
-                if column in df.columns and df[column].dtype == 'object':
-                    df[column] = pd.to_numeric(df[column], errors='coerce')
-                    st.warning("""Although the data remains accessible for exploration, it is highly recommended to 
-                               correct the file structure to ensure optimal performance on this page and to
-                               guarantee accurate results on the analytics dashboard that truly reflect the
-                               recently uploaded dataset.""")
-        except Exception as e:
-            st.error(f"An error occurred while processing the column '{column}': {e}")
-            st.warning(
-                """
-                Please refer to the Data Overview page to apply the correct data structure, 
-                ensuring numerical columns have strictly numeric values and categorical columns have strictly categorical values.
-                """
-            )
-            st.stop() 
-        
-    # Ensure 'customer_id' is set as the index
-    df.set_index('customerID', inplace=True)
-
-    # Ensure numerical columns are correctly typed
-    df = df.apply(pd.to_numeric, errors='ignore') 
-
-    # Handle missing values
-    numerical_columns = df.select_dtypes(include=['float64', 'int64']).columns.tolist()
-    numerical_imputer = SimpleImputer(strategy='median')
-    df[numerical_columns] = numerical_imputer.fit_transform(df[numerical_columns])
+    # Uploaded data is coerced and checked as it is prepared, once per dataset
+    try:
+        df, coerced_columns = load_prepared_dataset(dataset_key, df is not initial_df, df)
+    except Exception as e:
+        st.error(f"An error occurred while processing the uploaded data: {e}")
+        st.warning(
+            """
+            Please refer to the Data Overview page to apply the correct data structure, 
+            ensuring numerical columns have strictly numeric values and categorical columns have strictly categorical values.
+            """
+        )
+        st.stop()
+    if coerced_columns:
+        st.warning("""Although the data remains accessible for exploration, it is highly recommended to 
+                   correct the file structure to ensure optimal performance on this page and to
+                   guarantee accurate results on the analytics dashboard that truly reflect the
+                   recently uploaded dataset.""")
 
     # Sidebar widgets for numerical filters
     st.sidebar.header("Numerical Filter Options")
@@ -362,23 +300,16 @@ if st.session_state.get("authentication_status"):
         #     """
         # )
 
+                # Summaries are computed in one pass per column and memoized per dataset
+                numeric_summary_df, categorical_summary = load_profile(dataset_key, None, df)
+
                 # Summary for numerical features
-                numeric_summary_df = df.describe().T.reset_index()
-                numeric_summary_df.rename(columns={'index': 'Feature'}, inplace=True)
                 st.write("##### Numerical Features Summary")
-                st.dataframe(numeric_summary_df.set_index('Feature'))
+                st.dataframe(numeric_summary_df)
 
                 # Summary for categorical features
-                categorical_summary = df.select_dtypes(include=['object']).describe().T
-                categorical_summary['unique'] = df.select_dtypes(include=['object']).nunique()
-                categorical_summary['top'] = df.select_dtypes(include=['object']).mode().iloc[0]
-                categorical_summary['freq'] = df.select_dtypes(include=['object']).apply(pd.Series.value_counts).max()
-
-                categorical_summary = categorical_summary.reset_index()
-                categorical_summary.rename(columns={'index': 'Feature'}, inplace=True)
-                
                 st.write("##### Categorical Features Summary")
-                st.dataframe(categorical_summary.set_index('Feature'))
+                st.dataframe(categorical_summary)
 
             with st.expander("🧹 Filter Data", expanded=False):
                 st.write(
@@ -400,18 +331,22 @@ if st.session_state.get("authentication_status"):
         # )
 
                 # Dynamically detect numerical columns
-                numerical_columns = df.select_dtypes(include=['float64', 'int64']).columns.tolist()
+                numerical_columns = df.select_dtypes(include=['float32', 'float64', 'int64']).columns.tolist()
+
+                # Sorted column indexes and the customer ID lookup are built once per dataset
+                filter_index = get_filter_index(dataset_key, df)
 
                 # Create a dictionary to hold slider values for numerical features
                 slider_values = {}
 
                 for column in numerical_columns:
+                    min_value, max_value = filter_index.bounds(column)
                     if df[column].dtype == 'int64':
-                        min_value = int(df[column].min())
-                        max_value = int(df[column].max())
+                        min_value = int(min_value)
+                        max_value = int(max_value)
                     else:
-                        min_value = float(df[column].min())
-                        max_value = float(df[column].max())
+                        min_value = float(min_value)
+                        max_value = float(max_value)
                     slider_values[column] = st.sidebar.slider(
                         column,
                         min_value,
@@ -421,46 +356,38 @@ if st.session_state.get("authentication_status"):
 
                 # First layer filter for categorical columns
                 categorical_columns = df.select_dtypes(include=['object', 'category']).columns.tolist()
-                unique_customer_ids = df.index.unique()
 
                 if categorical_columns:
                     selected_column = st.selectbox("Select a categorical feature to filter by", categorical_columns)
 
                     if not selected_column == '':
-                        filtered_data = df                        
-                        unique_values = df[selected_column].unique()
                         # Add an empty string option as the first option for selecting a value
-                        unique_values_options = [''] + list(unique_values)
+                        unique_values_options = [''] + filter_index.values(selected_column)
                         selected_value = st.selectbox(f"Select a value from {selected_column}", unique_values_options, format_func=lambda x: 'All Values' if x == '' else x)
 
                         # Add filter for specific customer IDs
-                        options = [''] + list(unique_customer_ids)  
-                        selected_customer_id = st.sidebar.selectbox("Select a Customer ID", options, format_func=lambda x: str(x) if x else 'All Customers')
+                        selected_customer_id = st.sidebar.selectbox("Select a Customer ID", filter_index.customer_options, format_func=lambda x: str(x) if x else 'All Customers')
+
+                        # All selections and sliders are applied together in one indexed lookup
+                        filter_fingerprint = (tuple(slider_values.items()), selected_column, selected_value, selected_customer_id)
+                        filtered_data = filter_index.filter(
+                            ranges=slider_values,
+                            equals={selected_column: selected_value} if selected_value != '' else None,
+                            customer_id=selected_customer_id if selected_customer_id != '' else None
+                        )
 
                         if selected_value == '' and selected_customer_id == '':
-                            filtered_data = df
                             st.write("##### Filtered Data (showing all rows)")
                         elif selected_value != '' and selected_customer_id == '':
-                            filtered_data = df[df[selected_column] == selected_value]
                             st.write(f"##### Filtered Data (showing rows where {selected_column} is {selected_value})")
                         elif selected_value == '' and selected_customer_id != '':
-                            filtered_data = df[df.index == selected_customer_id]
                             st.write(f"##### Filtered Data (showing data for Customer ID {selected_customer_id})")
                         else:
-                            # Filter by selected value and customer ID
-                            filtered_data = df[(df[selected_column] == selected_value) & (df.index == selected_customer_id)]
                             if filtered_data.empty:
                                 st.write(f"##### No data found for Customer ID {selected_customer_id} with {selected_column} = {selected_value}")
                             else:
                                 st.write(f"##### Filtered Data (showing data for Customer ID {selected_customer_id} where {selected_column} is {selected_value})")
 
-
-                        # Apply numerical filters to the filtered data
-                        for column, (min_val, max_val) in slider_values.items():
-                            filtered_data = filtered_data[
-                                (filtered_data[column] >= min_val) & (filtered_data[column] <= max_val)
-                            ]
-
                         # Add filter for specific customer IDs
                         # options = [''] + list(unique_customer_ids)  # Add empty string as the first option
                         # selected_customer_id = st.sidebar.selectbox("Select a Customer ID", options, format_func=lambda x: str(x) if x else 'All Customers')
@@ -477,21 +404,15 @@ if st.session_state.get("authentication_status"):
 
                         # Display numerical and categorical summaries only if no specific customer is selected
                         if selected_customer_id == '':
+                            # Memoized per dataset and filter state
+                            filter_state = (tuple(slider_values.items()), selected_column, selected_value)
+                            numeric_filtered_summary_df, categorical_filtered_summary = load_profile(dataset_key, filter_state, filtered_data)
+
                             st.write("##### Numerical Features Summary for Filtered Data")
-                            numeric_filtered_summary_df = filtered_data.describe().T.reset_index()
-                            numeric_filtered_summary_df.rename(columns={'index': 'Feature'}, inplace=True)
-                            st.dataframe(numeric_filtered_summary_df.set_index('Feature'))
-
-                            categorical_filtered_summary = filtered_data.select_dtypes(include=['object']).describe().T
-                            categorical_filtered_summary['unique'] = filtered_data.select_dtypes(include=['object']).nunique()
-                            categorical_filtered_summary['top'] = filtered_data.select_dtypes(include=['object']).mode().iloc[0]
-                            categorical_filtered_summary['freq'] = filtered_data.select_dtypes(include=['object']).apply(pd.Series.value_counts).max()
-
-                            categorical_filtered_summary = categorical_filtered_summary.reset_index()
-                            categorical_filtered_summary.rename(columns={'index': 'Feature'}, inplace=True)
-                            
+                            st.dataframe(numeric_filtered_summary_df)
+
                             st.write("##### Categorical Features Summary for Filtered Data")
-                            st.dataframe(categorical_filtered_summary.set_index('Feature'))
+                            st.dataframe(categorical_filtered_summary)
 
                 else:
                     st.write("No categorical columns available for filtering.")
@@ -520,7 +441,9 @@ if st.session_state.get("authentication_status"):
                 # Map dtype values to more descriptive terms
                 df_info['Type'] = df_info['Type'].replace({
                     'object': 'Categorical',
+                    'category': 'Categorical',
                     'int64': 'Numerical',
+                    'float32': 'Numerical',
                     'float64': 'Numerical'
                 })
 
@@ -563,15 +486,16 @@ if st.session_state.get("authentication_status"):
                 st.write(
                     """
                     Download the dataset in multiple formats beyond the default CSV for enhanced analysis or dissemination. 
-                    Both the original and filtered datasets are available for download in the following formats: Excel, Stata, HTML, and JSON.
+                    Both the original and filtered datasets are available for download in the following formats: Excel, Stata, HTML, JSON, Parquet and gzipped CSV.
+                    Parquet and gzipped CSV are the quickest to download for large datasets.
                     """
                 )
                 st.write("##### Download Original Data")
-                generate_download_buttons_original(df)
+                generate_download_buttons(df, "original", (dataset_key, None))
                 
                 # Provide options to download the filtered data if applicable
                 st.write("##### Download Filtered Data")
-                generate_download_buttons_filtered(filtered_data)
+                generate_download_buttons(filtered_data, "filtered", (dataset_key, filter_fingerprint))
 
 else:
     st.warning("Please login to access this page.")
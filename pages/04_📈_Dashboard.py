@@ -3,13 +3,17 @@ import pandas as pd
 import numpy as np
 import base64
 import os
-import sqlite3
 from sklearn.impute import SimpleImputer
 import plotly.express as px
 import plotly.graph_objects as go
 from streamlit_lottie import st_lottie
 from utils.login import invoke_login_widget
 from utils.lottie import display_lottie_on_page
+from utils.datasets import encode_churn, load_template_dataset, to_numeric_or_keep
+from utils.schema import apply_schema
+from utils.user_db import get_user_database
+from utils.aggregates import ChurnCube
+from utils.charts import cached_figure, churn_count_bars, churn_histogram, churn_scatter_matrix
 
 # Invoke the login form
 invoke_login_widget('Analytics Dashboard')
@@ -46,91 +50,101 @@ if st.session_state.get("authentication_status"):
     # Add selectbox to choose between EDA and KPIs
     selected_analysis = st.selectbox('Select Analysis Type', ['', '🔍 Exploratory Data Analysis (EDA)', '📊 Key Performance Indicators (KPIs)'], index=0)
     
-    # Load the initial data from a local file
-    @st.cache_data(persist=True, show_spinner=False)
-    def load_initial_data():
-        df = pd.read_csv('./data/LP2_train_final.csv')
-        return df
-    
-    initial_df = load_initial_data()
     data_source = 'initial'  # Flag to identify the source of the DataFrame
 
+    # Define the list of specific columns to check and coerce
+    columns_to_coerce = ['Tenure', 'MonthlyCharges', 'TotalCharges', 'AvgMonthlyCharges', 'MonthlyChargesToTotalChargesRatio']
+
+    # The cleaned, typed and imputed frame, prepared once per user and dataset. Dataset tables are
+    # immutable once catalogued, so the dataset id identifies the contents; None is the template
+    @st.cache_data(show_spinner=False, max_entries=8)
+    def load_prepared_dataset(username, dataset_id, db_path=None, table_name=None):
+        if dataset_id is None:
+            # Load the initial data from the typed columnar cache of the template file
+            df = load_template_dataset()
+        else:
+            df = get_user_database(db_path).read_table(table_name)
+
+        # Ensure numerical columns are correctly typed
+        df = df.apply(to_numeric_or_keep)
+
+        # Ensure numerical columns are correctly typed for specific columns
+        for column in columns_to_coerce:
+            if column in df.columns and df[column].dtype == 'object':
+                df[column] = pd.to_numeric(df[column], errors='coerce')
+
+        # Handle missing values
+        numerical_columns = df.select_dtypes(include=['float32', 'float64', 'int64']).columns.tolist()
+        numerical_imputer = SimpleImputer(strategy='median')
+        df[numerical_columns] = numerical_imputer.fit_transform(df[numerical_columns])
+
+        # Hold the template columns in their declared compact dtypes
+        df = apply_schema(df)
+
+        # Churn is kept as int8 codes from here on, CHURN_LABELS turns them back into Yes and No
+        df['Churn'] = encode_churn(df['Churn'])
+        return df
+
     def load_most_recent_table(username):
         # Define the path for the user's SQLite database
         db_path = f"./data/{username}/{username}.db"
 
         if not os.path.exists(db_path):
             st.error("No database found for the user. Please ensure a file has been uploaded on the data overview page.")
-            return None, None
-
-        # Connect to the SQLite database
-        conn = sqlite3.connect(db_path)
+            return None, None, None
 
-        # Get the list of tables and their creation order
-        tables_query = """
-        SELECT name FROM sqlite_master 
-        WHERE type='table' 
-        ORDER BY tbl_name DESC LIMIT 1;
-        """
         try:
-            most_recent_table = conn.execute(tables_query).fetchone()
+            # The dataset catalog records upload order, table names are not compared
+            most_recent_dataset = get_user_database(db_path).latest_dataset()
 
-            if most_recent_table:
-                table_name = most_recent_table[0]
-                df = pd.read_sql_query(f"SELECT * FROM {table_name}", conn)
-                global data_sourc
-                data_source = 'uploaded'  # Update flag to indicate data is from upload
+            if most_recent_dataset:
+                dataset_id, table_name = most_recent_dataset
+                df = load_prepared_dataset(username, dataset_id, db_path, table_name)
             else:
                 st.error("No tables found in the database.")
-                return None, None
+                return None, None, None
         except Exception as e:
             st.error(f"An error occurred while loading the table: {e}")
-            return None, None
-        finally:
-            conn.close()
+            st.warning(
+                """
+                Please refer to the Data Overview page to apply the correct data structure, 
+                ensuring numerical columns have strictly numeric values and categorical columns have strictly categorical values.
+                """
+            )
+            return None, None, None
 
-        return df, table_name
+        return df, table_name, dataset_id
 
     # Load data from the uploaded file or use the initial data
+    dataset_id = None
     if st.button("Preview Template Dataset"):
         st.session_state['data_source'] = 'initial'
-        df = initial_df
+        df = load_prepared_dataset(None, None)
 
     else:
-        uploaded_df, table_name = load_most_recent_table(username)
-        df = uploaded_df if uploaded_df is not None else initial_df
+        uploaded_df, table_name, uploaded_dataset_id = load_most_recent_table(username)
+        df = uploaded_df if uploaded_df is not None else load_prepared_dataset(None, None)
+        if uploaded_df is not None:
+            data_source = 'uploaded'  # Update flag to indicate data is from upload
+            dataset_id = uploaded_dataset_id
 
     if df is not None:
         st.write(f"Most recent table: {table_name}" if data_source == 'uploaded' else "Using initial data")
 
-    # Ensure numerical columns are correctly typed
-    df = df.apply(pd.to_numeric, errors='ignore')
+    numerical_columns = df.select_dtypes(include=['float32', 'float64', 'int64']).columns.tolist()
 
-    # Define the list of specific columns to check and coerce
-    columns_to_coerce = ['Tenure', 'MonthlyCharges', 'TotalCharges', 'AvgMonthlyCharges', 'MonthlyChargesToTotalChargesRatio']
-
-    try:
-        # Ensure numerical columns are correctly typed for specific columns
-        for column in columns_to_coerce:
-            if column in df.columns and df[column].dtype == 'object':
-                df[column] = pd.to_numeric(df[column], errors='coerce')
-    except Exception as e:
-        st.error(f"An error occurred while processing the column '{column}': {e}")
-        st.warning(
-            """
-            Please refer to the Data Overview page to apply the correct data structure, 
-            ensuring numerical columns have strictly numeric values and categorical columns have strictly categorical values.
-            """
-        )
-        st.stop()  
+    # KPI aggregates, built once per user and dataset like the prepared frame they come from
+    @st.cache_resource(show_spinner=False, max_entries=8)
+    def get_churn_cube(username, dataset_id, _df):
+        return ChurnCube(_df, numerical_columns)
 
-    # Handle missing values
-    numerical_columns = df.select_dtypes(include=['float64', 'int64']).columns.tolist()
-    numerical_imputer = SimpleImputer(strategy='median')
-    df[numerical_columns] = numerical_imputer.fit_transform(df[numerical_columns])
+    # Churn by tenure has a cube of its own, tenure has too many values to share the main cube's key
+    @st.cache_resource(show_spinner=False, max_entries=8)
+    def get_tenure_cube(username, dataset_id, _df):
+        return ChurnCube(_df, numerical_columns, dimensions=['Tenure'], measures=[], correlation_columns=[])
 
-    # Create a function to apply filters
-    def apply_filters(df):
+    # Read the filter sliders from the sidebar
+    def get_slider_values(df):
         slider_values = {}
         for column in numerical_columns:
             if df[column].dtype == 'int64':
@@ -145,154 +159,189 @@ if st.session_state.get("authentication_status"):
                 max_value,
                 (min_value, max_value)
             )
+        return slider_values
 
-        filtered_data = df.copy()
+    # Create a function to apply filters. All slider ranges are combined into one mask over the
+    # column arrays and the positions of the matching rows are returned, the frame is not copied
+    def apply_filters(df, slider_values):
+        mask = np.ones(len(df), dtype=bool)
         for column, (min_val, max_val) in slider_values.items():
-            filtered_data = filtered_data[
-                (filtered_data[column] >= min_val) & (filtered_data[column] <= max_val)
-            ]
-        return filtered_data
+            values = df[column].to_numpy()
+            mask &= (values >= min_val) & (values <= max_val)
+        return np.flatnonzero(mask)
 
-    # Apply filters to the data
-    filtered_data = apply_filters(df)
+    slider_values = get_slider_values(df)
+
+    # Figures are reused while the dataset and the filters stay the same
+    figure_key = (username, dataset_id, tuple(slider_values.items()))
 
     if selected_analysis == '':
         st.write("Please select an analysis type to begin.")
 
     elif selected_analysis == '🔍 Exploratory Data Analysis (EDA)':
+        # Apply filters to the data
+        filtered_rows = apply_filters(df, slider_values)
+
         st.subheader("🕵🏾‍♂️ Churn EDA Dashboard")
         st.write(
             "This dashboard provides an exploratory analysis of customer churn data. The visualizations help identify key demographic and account characteristics, correlations, and trends that can guide strategic decisions. Use the filters and plots to understand customer behavior and identify potential areas for improvement."
         )
         
-        # Adjust grid layout to 2x2 for better alignment
-        st.markdown("#### Customer Demographic Analysis")
-        st.write(
-            "This section analyzes customer demographics to understand the distribution of key attributes such as gender, age, and relationships. By examining these factors, you can uncover patterns that might influence customer retention and acquisition."
-        )
-        with st.container():
-            col1, col2 = st.columns(2)
-
-            with col1:
-                gender_plot = px.histogram(filtered_data, x="Gender", color="Churn", barmode="group", title="Gender Distribution")
-                st.plotly_chart(gender_plot, use_container_width=True)
-
-            with col2:
-                senior_citizen_plot = px.histogram(filtered_data, x="SeniorCitizen", color="Churn", barmode="group", title="Senior Citizen Distribution")
-                st.plotly_chart(senior_citizen_plot, use_container_width=True)
+        # Each chart group is a fragment whose charts are built only while its expander is open,
+        # opening or closing a group reruns that group alone
+        @st.fragment
+        def show_demographic_analysis():
+            section = st.expander("Customer Demographic Analysis", expanded=True, key='eda_demographic', on_change="rerun")
+            if section.open:
+                with section:
+                    st.write(
+                        "This section analyzes customer demographics to understand the distribution of key attributes such as gender, age, and relationships. By examining these factors, you can uncover patterns that might influence customer retention and acquisition."
+                    )
+                    # Adjust grid layout to 2x2 for better alignment
+                    with st.container():
+                        col1, col2 = st.columns(2)
+
+                        with col1:
+                            gender_plot = cached_figure(figure_key, 'gender_plot', lambda: churn_count_bars(df, "Gender", "Gender Distribution", rows=filtered_rows))
+                            st.plotly_chart(gender_plot, use_container_width=True)
+
+                        with col2:
+                            senior_citizen_plot = cached_figure(figure_key, 'senior_citizen_plot', lambda: churn_count_bars(df, "SeniorCitizen", "Senior Citizen Distribution", rows=filtered_rows))
+                            st.plotly_chart(senior_citizen_plot, use_container_width=True)
  
-        with st.container():
-            col1, col2 = st.columns(2)
+                    with st.container():
+                        col1, col2 = st.columns(2)
 
-            with col1:
-                partner_plot = px.histogram(filtered_data, x="Partner", color="Churn", barmode="group", title="Partner Distribution")
-                st.plotly_chart(partner_plot, use_container_width=True)
+                        with col1:
+                            partner_plot = cached_figure(figure_key, 'partner_plot', lambda: churn_count_bars(df, "Partner", "Partner Distribution", rows=filtered_rows))
+                            st.plotly_chart(partner_plot, use_container_width=True)
             
-            with col2:
-                dependents_plot = px.histogram(filtered_data, x="Dependents", color="Churn", barmode="group", title="Dependents Distribution")
-                st.plotly_chart(dependents_plot, use_container_width=True)
-
-        st.markdown("#### Customer Account Analysis")        
-        st.write(
-            "This section provides insights into customer account characteristics, including monthly and total charges, as well as tenure. The distributions and histograms reveal patterns in spending and account duration, which are crucial for understanding customer value and predicting churn."
-        )
-        with st.container():
-            col1, col2, col3 = st.columns(3)
-
-            with col1:
-                monthly_charges_plot = px.histogram(filtered_data, x='MonthlyCharges', nbins=20, color='Churn', title='Monthly Charges Distribution')
-                st.plotly_chart(monthly_charges_plot, use_container_width=True)
-
-            with col2:
-                total_charges_plot = px.histogram(filtered_data, x='TotalCharges', nbins=20, color='Churn', title='Total Charges Distribution')
-                st.plotly_chart(total_charges_plot, use_container_width=True)
-
-            with col3:                         
-                tenure_plot = px.histogram(filtered_data, x='Tenure', nbins=20, color='Churn', title='Tenure Distribution')
-                st.plotly_chart(tenure_plot, use_container_width=True)   
-
-        with st.container():
-            filtered_data['Churn'] = filtered_data['Churn'].map({'Yes': 1, 'No': 0})
-            col1, col2 = st.columns(2)
-
-            with col1:
-                # Correlation Heatmap
-                corr_matrix = filtered_data[["Churn", "MonthlyCharges", "TotalCharges", "Tenure"]].dropna().corr()
-
-                # Annotate the heatmap with correlation values
-                heatmap = go.Figure(data=go.Heatmap(
-                    z=corr_matrix.values,
-                    x=corr_matrix.columns,
-                    y=corr_matrix.columns,
-                    colorscale="RdBu",
-                    text=corr_matrix.values,  
-                    texttemplate="%{text:.2f}",  
-                    showscale=True  
-                ))
-
-                heatmap.update_layout(
-                    title="Correlation Matrix",
-                    xaxis_nticks=36
-                )
-
-                st.plotly_chart(heatmap)
+                        with col2:
+                            dependents_plot = cached_figure(figure_key, 'dependents_plot', lambda: churn_count_bars(df, "Dependents", "Dependents Distribution", rows=filtered_rows))
+                            st.plotly_chart(dependents_plot, use_container_width=True)
+
+        show_demographic_analysis()
+
+        @st.fragment
+        def show_account_analysis():
+            section = st.expander("Customer Account Analysis", expanded=False, key='eda_account', on_change="rerun")
+            if section.open:
+                with section:
+                    st.write(
+                        "This section provides insights into customer account characteristics, including monthly and total charges, as well as tenure. The distributions and histograms reveal patterns in spending and account duration, which are crucial for understanding customer value and predicting churn."
+                    )
+                    with st.container():
+                        col1, col2, col3 = st.columns(3)
+
+                        with col1:
+                            monthly_charges_plot = cached_figure(figure_key, 'monthly_charges_plot', lambda: churn_histogram(df, 'MonthlyCharges', 20, 'Monthly Charges Distribution', rows=filtered_rows))
+                            st.plotly_chart(monthly_charges_plot, use_container_width=True)
+
+                        with col2:
+                            total_charges_plot = cached_figure(figure_key, 'total_charges_plot', lambda: churn_histogram(df, 'TotalCharges', 20, 'Total Charges Distribution', rows=filtered_rows))
+                            st.plotly_chart(total_charges_plot, use_container_width=True)
+
+                        with col3:                         
+                            tenure_plot = cached_figure(figure_key, 'tenure_plot', lambda: churn_histogram(df, 'Tenure', 20, 'Tenure Distribution', rows=filtered_rows))
+                            st.plotly_chart(tenure_plot, use_container_width=True)   
+
+                    with st.container():
+                        col1, col2 = st.columns(2)
+
+                        with col1:
+                            def build_heatmap():
+                                # Correlation Heatmap, from the moments the churn cube keeps per cell
+                                corr_matrix = get_churn_cube(username, dataset_id, df).select(slider_values).correlation()
+
+                                # Annotate the heatmap with correlation values
+                                heatmap = go.Figure(data=go.Heatmap(
+                                    z=corr_matrix.values,
+                                    x=corr_matrix.columns,
+                                    y=corr_matrix.columns,
+                                    colorscale="RdBu",
+                                    text=corr_matrix.values,  
+                                    texttemplate="%{text:.2f}",  
+                                    showscale=True  
+                                ))
+
+                                heatmap.update_layout(
+                                    title="Correlation Matrix",
+                                    xaxis_nticks=36
+                                )
+                                return heatmap
+
+                            heatmap = cached_figure(figure_key, 'heatmap', build_heatmap)
+                            st.plotly_chart(heatmap)
             
-            with col2:
-                # Pair Plot
-                pairplot_fig = px.scatter_matrix(
-                    filtered_data[["Churn", "Tenure", "MonthlyCharges", "TotalCharges"]],
-                    dimensions=["TotalCharges", "Tenure", "MonthlyCharges"],
-                    color="Churn",
-                    title="Pairplot"
-                )
-                st.plotly_chart(pairplot_fig)
-
-        st.markdown("#### Customer Contractual Analysis")
-        st.write(
-            "This section examines customer contracts and payment methods. It provides an overview of contract types, payment methods, and billing preferences, which can offer insights into customer loyalty and potential areas for optimizing pricing strategies."
-        )
-        with st.container():
-            filtered_data['Churn'] = filtered_data['Churn'].map({1: 'Yes', 0: 'No'})
-            col1, col2, col3 = st.columns(3)
-
-            with col1:
-                contract_plot = px.histogram(filtered_data, x="Contract", color="Churn", barmode="group", title="Contract Distribution")
-                st.plotly_chart(contract_plot, use_container_width=True)
-
-            with col2:
-                payment_method_plot = px.histogram(filtered_data, x="PaymentMethod", color="Churn", barmode="group", title="Payment Method Distribution")
-                st.plotly_chart(payment_method_plot, use_container_width=True)
-
-            with col3:
-                paperless_billing_plot = px.histogram(filtered_data, x="PaperlessBilling", color="Churn", barmode="group", title="Paperless Billing Distribution")
-                st.plotly_chart(paperless_billing_plot, use_container_width=True)
-
-        st.markdown("#### Customer Subscription Analysis")
-        st.write(
-            "This section explores customer service subscriptions, including phone, internet, and tech support services. It highlights the distribution of these services among customers and their relationship with churn behavior."
-        )
-
-        with st.container():
-            col1, col2 = st.columns(2)
-
-            with col1:
-                phone_service_plot = px.histogram(filtered_data, x="PhoneService", color="Churn", barmode="group", title="Phone Service Distribution")
-                st.plotly_chart(phone_service_plot, use_container_width=True)
-
-            with col2:
-                multiple_lines_plot = px.histogram(filtered_data, x="MultipleLines", color="Churn", barmode="group", title="Multiple Lines Distribution")
-                st.plotly_chart(multiple_lines_plot, use_container_width=True)
-
-        with st.container():
-            col1, col2 = st.columns(2)
-
-            with col1:
-                internet_service_plot = px.histogram(filtered_data, x="InternetService", color="Churn", barmode="group", title="Internet Service Distribution")
-                st.plotly_chart(internet_service_plot, use_container_width=True)
-
-            with col2:
-                techsupport_plot = px.histogram(filtered_data, x="TechSupport", color="Churn", barmode="group", title="Tech Support Distribution")
-                st.plotly_chart(techsupport_plot, use_container_width=True)
+                        with col2:
+                            # Pair Plot
+                            pairplot_fig = cached_figure(figure_key, 'pairplot_fig', lambda: churn_scatter_matrix(
+                                df,
+                                dimensions=["TotalCharges", "Tenure", "MonthlyCharges"],
+                                title="Pairplot",
+                                rows=filtered_rows
+                            ))
+                            st.plotly_chart(pairplot_fig)
+
+        show_account_analysis()
+
+        @st.fragment
+        def show_contractual_analysis():
+            section = st.expander("Customer Contractual Analysis", expanded=False, key='eda_contractual', on_change="rerun")
+            if section.open:
+                with section:
+                    st.write(
+                        "This section examines customer contracts and payment methods. It provides an overview of contract types, payment methods, and billing preferences, which can offer insights into customer loyalty and potential areas for optimizing pricing strategies."
+                    )
+                    with st.container():
+                        col1, col2, col3 = st.columns(3)
+
+                        with col1:
+                            contract_plot = cached_figure(figure_key, 'contract_plot', lambda: churn_count_bars(df, "Contract", "Contract Distribution", rows=filtered_rows))
+                            st.plotly_chart(contract_plot, use_container_width=True)
+
+                        with col2:
+                            payment_method_plot = cached_figure(figure_key, 'payment_method_plot', lambda: churn_count_bars(df, "PaymentMethod", "Payment Method Distribution", rows=filtered_rows))
+                            st.plotly_chart(payment_method_plot, use_container_width=True)
+
+                        with col3:
+                            paperless_billing_plot = cached_figure(figure_key, 'paperless_billing_plot', lambda: churn_count_bars(df, "PaperlessBilling", "Paperless Billing Distribution", rows=filtered_rows))
+                            st.plotly_chart(paperless_billing_plot, use_container_width=True)
+
+        show_contractual_analysis()
+
+        @st.fragment
+        def show_subscription_analysis():
+            section = st.expander("Customer Subscription Analysis", expanded=False, key='eda_subscription', on_change="rerun")
+            if section.open:
+                with section:
+                    st.write(
+                        "This section explores customer service subscriptions, including phone, internet, and tech support services. It highlights the distribution of these services among customers and their relationship with churn behavior."
+                    )
+
+                    with st.container():
+                        col1, col2 = st.columns(2)
+
+                        with col1:
+                            phone_service_plot = cached_figure(figure_key, 'phone_service_plot', lambda: churn_count_bars(df, "PhoneService", "Phone Service Distribution", rows=filtered_rows))
+                            st.plotly_chart(phone_service_plot, use_container_width=True)
+
+                        with col2:
+                            multiple_lines_plot = cached_figure(figure_key, 'multiple_lines_plot', lambda: churn_count_bars(df, "MultipleLines", "Multiple Lines Distribution", rows=filtered_rows))
+                            st.plotly_chart(multiple_lines_plot, use_container_width=True)
+
+                    with st.container():
+                        col1, col2 = st.columns(2)
+
+                        with col1:
+                            internet_service_plot = cached_figure(figure_key, 'internet_service_plot', lambda: churn_count_bars(df, "InternetService", "Internet Service Distribution", rows=filtered_rows))
+                            st.plotly_chart(internet_service_plot, use_container_width=True)
+
+                        with col2:
+                            techsupport_plot = cached_figure(figure_key, 'techsupport_plot', lambda: churn_count_bars(df, "TechSupport", "Tech Support Distribution", rows=filtered_rows))
+                            st.plotly_chart(techsupport_plot, use_container_width=True)
+
+        show_subscription_analysis()
 
         if data_source == 'initial':
             st.markdown("""
@@ -338,16 +387,17 @@ if st.session_state.get("authentication_status"):
         Use this dashboard to analyze the impact of various filters on customer retention and overall business metrics.
         """)
 
-        # Apply a map to the data frame for the chun column
-        df['Churn'] = df['Churn'].map({'Yes': 1, 'No': 0})
-        filtered_data['Churn'] = filtered_data['Churn'].map({'Yes': 1, 'No': 0})
-  
+        # The KPIs are summed from the churn cube instead of rescanning the filtered rows
+        churn_cube = get_churn_cube(username, dataset_id, df)
+        unfiltered_kpis = churn_cube.select()
+        filtered_kpis = churn_cube.select(slider_values)
+
         # Calculate unfiltered values
-        unfiltered_total_customers = df.shape[0]
-        unfiltered_total_customers_retained = len(df[df["Churn"] == 0])
-        unfiltered_avg_tenure = df['Tenure'].mean()
-        unfiltered_avg_monthly_charges = df['MonthlyCharges'].mean()
-        unfiltered_total_revenue = df['TotalCharges'].sum()
+        unfiltered_total_customers = unfiltered_kpis.count
+        unfiltered_total_customers_retained = unfiltered_kpis.retained
+        unfiltered_avg_tenure = unfiltered_kpis.mean('Tenure')
+        unfiltered_avg_monthly_charges = unfiltered_kpis.mean('MonthlyCharges')
+        unfiltered_total_revenue = unfiltered_kpis.total('TotalCharges sum')
 
         # Create a container to align metrics side by side
         with st.container():
@@ -355,7 +405,7 @@ if st.session_state.get("authentication_status"):
 
             with col1:
                 # KPI 1: Total Customers
-                total_customers = filtered_data.shape[0]
+                total_customers = filtered_kpis.count
                 total_customers_delta = (total_customers - unfiltered_total_customers) / unfiltered_total_customers * 100
                 st.metric(
                     label="Total Customers", 
@@ -366,7 +416,7 @@ if st.session_state.get("authentication_status"):
 
             with col2:
                 # KPI 2: Total Customers Retained
-                total_customers_retained = len(filtered_data[filtered_data["Churn"] == 0])
+                total_customers_retained = filtered_kpis.retained
                 total_customers_retained_delta = (total_customers_retained - unfiltered_total_customers_retained) / unfiltered_total_customers_retained * 100
                 st.metric(
                     label="Total Customers Retained", 
@@ -377,7 +427,7 @@ if st.session_state.get("authentication_status"):
 
             with col3:
                 # KPI 3: Average Tenure
-                avg_tenure = filtered_data['Tenure'].mean()
+                avg_tenure = filtered_kpis.mean('Tenure')
                 avg_tenure_delta = (avg_tenure - unfiltered_avg_tenure) / unfiltered_avg_tenure * 100
                 st.metric(
                     label="Avg. Tenure (Months)", 
@@ -388,7 +438,7 @@ if st.session_state.get("authentication_status"):
 
             with col4:
                 # KPI 4: Average Monthly Charges
-                avg_monthly_charges = filtered_data['MonthlyCharges'].mean()
+                avg_monthly_charges = filtered_kpis.mean('MonthlyCharges')
                 avg_monthly_charges_delta = (avg_monthly_charges - unfiltered_avg_monthly_charges) / unfiltered_avg_monthly_charges * 100
                 st.metric(
                     label="Avg. Monthly Charges", 
@@ -399,7 +449,7 @@ if st.session_state.get("authentication_status"):
 
             with col5:
                 # KPI 5: Total Revenue
-                total_revenue = filtered_data['TotalCharges'].sum()
+                total_revenue = filtered_kpis.total('TotalCharges sum')
                 total_revenue_delta = (total_revenue - unfiltered_total_revenue) / unfiltered_total_revenue * 100
                 st.metric(
                     label="Total Revenue", 
@@ -409,10 +459,10 @@ if st.session_state.get("authentication_status"):
                 )
 
         # Additional KPI: Churn Rate Gauge
-        churn_rate = filtered_data['Churn'].mean() * 100
-        unfiltered_churn_rate = df['Churn'].mean() * 100
+        churn_rate = filtered_kpis.churn_rate() * 100
+        unfiltered_churn_rate = unfiltered_kpis.churn_rate() * 100
 
-        fig_churn_rate = go.Figure(go.Indicator(
+        fig_churn_rate = cached_figure(figure_key, 'fig_churn_rate', lambda: go.Figure(go.Indicator(
             mode="gauge+number+delta",
             value=churn_rate,
             number={'suffix': "%", 'valueformat': ".2f"},
@@ -440,7 +490,7 @@ if st.session_state.get("authentication_status"):
                     "value": churn_rate
                 }
             }
-        ))
+        )))
 
         # Display the gauge in Streamlit
         st.plotly_chart(fig_churn_rate)
@@ -456,120 +506,131 @@ if st.session_state.get("authentication_status"):
         """)
 
         # Section: Distributions
-        st.markdown("#### Distribution of Features")
-        st.markdown("""
-        This section visualizes the distribution of key features in the dataset. It includes:
-        - **Contract Distribution:** Shows the breakdown of customer contracts.
-        - **Payment Method Distribution:** Displays how customers are distributed across different payment methods.
-        - **Internet Service Distribution:** Illustrates how customers are distributed across various internet service types.
-        - **Phone Service Distribution:** Demonstrates the distribution of customers based on their phone service options.
-        """)
-
-        # Distribution plots
-        col1, col2 = st.columns(2)
-
-        with col1:
-            # Plot: Contract Distribution
-            contract_distribution = filtered_data['Contract'].value_counts()
-            fig_contract = px.pie(contract_distribution, values=contract_distribution.values, names=contract_distribution.index, hole=0.3, title="Contract Distribution")
-            st.plotly_chart(fig_contract, use_container_width=True)
-
-            # Plot: Internet Service Distribution
-            internet_service_distribution = filtered_data['InternetService'].value_counts()
-            fig_internet_service_distribution = px.pie(internet_service_distribution, values=internet_service_distribution.values, names=internet_service_distribution.index, hole=0.3, title="Internet Service Distribution")
-            st.plotly_chart(fig_internet_service_distribution, use_container_width=True)
-
-        with col2:
-            # Plot: Payment Method Distribution
-            payment_method_distribution = filtered_data['PaymentMethod'].value_counts()
-            fig_payment_method_distribution = px.pie(payment_method_distribution, values=payment_method_distribution.values, names=payment_method_distribution.index, hole=0.3, title="Payment Method Distribution")
-            st.plotly_chart(fig_payment_method_distribution, use_container_width=True)
-
-            # Plot: Phone Service Distribution
-            phone_service_distribution = filtered_data['PhoneService'].value_counts()
-            fig_phone_service_distribution = px.pie(phone_service_distribution, values=phone_service_distribution.values, names=phone_service_distribution.index, hole=0.3, title="Phone Service Distribution")
-            st.plotly_chart(fig_phone_service_distribution, use_container_width=True)
-
+        @st.fragment
+        def show_feature_distributions():
+            section = st.expander("Distribution of Features", expanded=True, key='kpi_distributions', on_change="rerun")
+            if section.open:
+                with section:
+                    st.markdown("""
+                    This section visualizes the distribution of key features in the dataset. It includes:
+                    - **Contract Distribution:** Shows the breakdown of customer contracts.
+                    - **Payment Method Distribution:** Displays how customers are distributed across different payment methods.
+                    - **Internet Service Distribution:** Illustrates how customers are distributed across various internet service types.
+                    - **Phone Service Distribution:** Demonstrates the distribution of customers based on their phone service options.
+                    """)
+
+                    # Distribution plots
+                    col1, col2 = st.columns(2)
+
+                    with col1:
+                        # Plot: Contract Distribution
+                        contract_distribution = filtered_kpis.value_counts('Contract')
+                        fig_contract = cached_figure(figure_key, 'fig_contract', lambda: px.pie(contract_distribution, values=contract_distribution.values, names=contract_distribution.index, hole=0.3, title="Contract Distribution"))
+                        st.plotly_chart(fig_contract, use_container_width=True)
+
+                        # Plot: Internet Service Distribution
+                        internet_service_distribution = filtered_kpis.value_counts('InternetService')
+                        fig_internet_service_distribution = cached_figure(figure_key, 'fig_internet_service_distribution', lambda: px.pie(internet_service_distribution, values=internet_service_distribution.values, names=internet_service_distribution.index, hole=0.3, title="Internet Service Distribution"))
+                        st.plotly_chart(fig_internet_service_distribution, use_container_width=True)
+
+                    with col2:
+                        # Plot: Payment Method Distribution
+                        payment_method_distribution = filtered_kpis.value_counts('PaymentMethod')
+                        fig_payment_method_distribution = cached_figure(figure_key, 'fig_payment_method_distribution', lambda: px.pie(payment_method_distribution, values=payment_method_distribution.values, names=payment_method_distribution.index, hole=0.3, title="Payment Method Distribution"))
+                        st.plotly_chart(fig_payment_method_distribution, use_container_width=True)
+
+                        # Plot: Phone Service Distribution
+                        phone_service_distribution = filtered_kpis.value_counts('PhoneService')
+                        fig_phone_service_distribution = cached_figure(figure_key, 'fig_phone_service_distribution', lambda: px.pie(phone_service_distribution, values=phone_service_distribution.values, names=phone_service_distribution.index, hole=0.3, title="Phone Service Distribution"))
+                        st.plotly_chart(fig_phone_service_distribution, use_container_width=True)
+
+        show_feature_distributions()
 
         # Section: Comparing Feature Parameters
-        st.markdown("#### Comparing Feature Parameters Based on Churn Rate")
-        st.markdown("""
-        This section provides insights into how different feature parameters relate to churn rates. It includes:
-        - **Churn Rate by Gender:** Compares churn rates across different genders.
-        - **Churn Rate Over Tenure:** Shows how churn rate changes with customer tenure.
-        - **Churn Rate by Contract Type:** Examines how churn rates vary with different contract types.
-        - **Churn Rate by Payment Method:** Investigates churn rates based on different payment methods.
-        - **Average Monthly Charges by Contract Type:** Analyzes average charges based on contract type.
-        - **Total Monthly Charges by Contract Type:** Displays total monthly charges for each contract type.
-        - **Churn Rate by Internet Service:** Looks at how internet service type affects churn rates.
-        - **Churn Rate by Phone Service:** Analyzes churn rates based on whether customers have phone service.
-        """)
-
-        # Comparing Feature Parameters Plot
-        with st.container():
-            col1, col2 = st.columns(2)
-
-            with col1:
-                # Plot: Churn Rate by Gender
-                churn_by_gender = filtered_data.groupby('Gender')['Churn'].mean().reset_index()
-                churn_by_gender['Churn'] = churn_by_gender['Churn'] * 100
-                fig_gender_churn = px.bar(churn_by_gender, x='Gender', y='Churn', title='Churn Rate by Gender')
-                st.plotly_chart(fig_gender_churn, use_container_width=True)
-
-            with col2:
-                # Plot: Line Chart for Churn Rate over Tenure
-                churn_rate_by_tenure = filtered_data.groupby('Tenure')['Churn'].mean().reset_index()
-                fig_churn_tenure = px.line(churn_rate_by_tenure, x='Tenure', y='Churn', title='Churn Rate over Tenure')
-                st.plotly_chart(fig_churn_tenure, use_container_width=True)
-
-        with st.container():
-            col1, col2 = st.columns(2)
-
-            with col1:
-                # Plot: Churn Rate by Contract Type
-                churn_by_contract = filtered_data.groupby('Contract')['Churn'].mean().reset_index()
-                churn_by_contract['Churn'] = churn_by_contract['Churn'] * 100
-                fig_contract_churn = px.bar(churn_by_contract, x='Contract', y='Churn', title='Churn Rate by Contract Type')
-                st.plotly_chart(fig_contract_churn, use_container_width=True)
-
-            with col2:
-                # Plot: Churn Rate by Payment Method
-                churn_by_payment_method = filtered_data.groupby('PaymentMethod')['Churn'].mean().reset_index()
-                churn_by_payment_method['Churn'] = churn_by_payment_method['Churn'] * 100
-                fig_churn_by_payment_method = px.bar(churn_by_payment_method, x='PaymentMethod', y='Churn', title='Churn Rate by Payment Method')
-                st.plotly_chart(fig_churn_by_payment_method, use_container_width=True)
-
-        with st.container():
-            col1, col2 = st.columns(2)
-
-            with col1:
-                # Plot: Average Monthly Charges by Contract Type
-                avg_charges_by_contract = filtered_data.groupby('Contract')['MonthlyCharges'].mean().reset_index()
-                fig_avg_contract_charges = px.bar(avg_charges_by_contract, x='Contract', y='MonthlyCharges', title='Avg. Monthly Charges by Contract Type')
-                st.plotly_chart(fig_avg_contract_charges)
-
-            with col2:
-                # Plot: Total Monthly Charges by Contract Type
-                total_charges_by_contract = filtered_data.groupby('Contract')['TotalCharges'].mean().reset_index()
-                fig_total_contract_charges = px.bar(total_charges_by_contract, x='Contract', y='TotalCharges', title='Total Monthly Charges by Contract Type')
-                st.plotly_chart(fig_total_contract_charges)
-
-        with st.container():
-            col1, col2 = st.columns(2)
-
-            with col1:           
-                # Plot: Churn Rate by Internet Service
-                churn_by_internet_service = filtered_data.groupby('InternetService')['Churn'].mean().reset_index()
-                churn_by_internet_service['Churn'] = churn_by_internet_service['Churn'] * 100
-                fig_churn_by_internet_service = px.bar(churn_by_internet_service, x='InternetService', y='Churn', title='Churn Rate by Internet Service')
-                st.plotly_chart(fig_churn_by_internet_service)
-
-            with col2:
-                # Plot: Churn Rate by Phone Service
-                churn_by_phone_service = filtered_data.groupby('PhoneService')['Churn'].mean().reset_index()
-                churn_by_phone_service['Churn'] = churn_by_phone_service['Churn'] * 100
-                fig_churn_by_phone_service = px.bar(churn_by_phone_service, x='PhoneService', y='Churn', title='Churn Rate by Phone Service')
-                st.plotly_chart(fig_churn_by_phone_service)
+        @st.fragment
+        def show_churn_rate_comparisons():
+            section = st.expander("Comparing Feature Parameters Based on Churn Rate", expanded=False, key='kpi_churn_rates', on_change="rerun")
+            if section.open:
+                with section:
+                    st.markdown("""
+                    This section provides insights into how different feature parameters relate to churn rates. It includes:
+                    - **Churn Rate by Gender:** Compares churn rates across different genders.
+                    - **Churn Rate Over Tenure:** Shows how churn rate changes with customer tenure.
+                    - **Churn Rate by Contract Type:** Examines how churn rates vary with different contract types.
+                    - **Churn Rate by Payment Method:** Investigates churn rates based on different payment methods.
+                    - **Average Monthly Charges by Contract Type:** Analyzes average charges based on contract type.
+                    - **Total Monthly Charges by Contract Type:** Displays total monthly charges for each contract type.
+                    - **Churn Rate by Internet Service:** Looks at how internet service type affects churn rates.
+                    - **Churn Rate by Phone Service:** Analyzes churn rates based on whether customers have phone service.
+                    """)
+
+                    # Comparing Feature Parameters Plot
+                    with st.container():
+                        col1, col2 = st.columns(2)
+
+                        with col1:
+                            # Plot: Churn Rate by Gender
+                            churn_by_gender = filtered_kpis.churn_rate_by('Gender')
+                            churn_by_gender['Churn'] = churn_by_gender['Churn'] * 100
+                            fig_gender_churn = cached_figure(figure_key, 'fig_gender_churn', lambda: px.bar(churn_by_gender, x='Gender', y='Churn', title='Churn Rate by Gender'))
+                            st.plotly_chart(fig_gender_churn, use_container_width=True)
+
+                        with col2:
+                            # Plot: Line Chart for Churn Rate over Tenure
+                            churn_rate_by_tenure = get_tenure_cube(username, dataset_id, df).select(slider_values).churn_rate_by('Tenure')
+                            fig_churn_tenure = cached_figure(figure_key, 'fig_churn_tenure', lambda: px.line(churn_rate_by_tenure, x='Tenure', y='Churn', title='Churn Rate over Tenure'))
+                            st.plotly_chart(fig_churn_tenure, use_container_width=True)
+
+                    with st.container():
+                        col1, col2 = st.columns(2)
+
+                        with col1:
+                            # Plot: Churn Rate by Contract Type
+                            churn_by_contract = filtered_kpis.churn_rate_by('Contract')
+                            churn_by_contract['Churn'] = churn_by_contract['Churn'] * 100
+                            fig_contract_churn = cached_figure(figure_key, 'fig_contract_churn', lambda: px.bar(churn_by_contract, x='Contract', y='Churn', title='Churn Rate by Contract Type'))
+                            st.plotly_chart(fig_contract_churn, use_container_width=True)
+
+                        with col2:
+                            # Plot: Churn Rate by Payment Method
+                            churn_by_payment_method = filtered_kpis.churn_rate_by('PaymentMethod')
+                            churn_by_payment_method['Churn'] = churn_by_payment_method['Churn'] * 100
+                            fig_churn_by_payment_method = cached_figure(figure_key, 'fig_churn_by_payment_method', lambda: px.bar(churn_by_payment_method, x='PaymentMethod', y='Churn', title='Churn Rate by Payment Method'))
+                            st.plotly_chart(fig_churn_by_payment_method, use_container_width=True)
+
+                    with st.container():
+                        col1, col2 = st.columns(2)
+
+                        with col1:
+                            # Plot: Average Monthly Charges by Contract Type
+                            avg_charges_by_contract = filtered_kpis.mean_by('Contract', 'MonthlyCharges')
+                            fig_avg_contract_charges = cached_figure(figure_key, 'fig_avg_contract_charges', lambda: px.bar(avg_charges_by_contract, x='Contract', y='MonthlyCharges', title='Avg. Monthly Charges by Contract Type'))
+                            st.plotly_chart(fig_avg_contract_charges)
+
+                        with col2:
+                            # Plot: Total Monthly Charges by Contract Type
+                            total_charges_by_contract = filtered_kpis.mean_by('Contract', 'TotalCharges')
+                            fig_total_contract_charges = cached_figure(figure_key, 'fig_total_contract_charges', lambda: px.bar(total_charges_by_contract, x='Contract', y='TotalCharges', title='Total Monthly Charges by Contract Type'))
+                            st.plotly_chart(fig_total_contract_charges)
+
+                    with st.container():
+                        col1, col2 = st.columns(2)
+
+                        with col1:           
+                            # Plot: Churn Rate by Internet Service
+                            churn_by_internet_service = filtered_kpis.churn_rate_by('InternetService')
+                            churn_by_internet_service['Churn'] = churn_by_internet_service['Churn'] * 100
+                            fig_churn_by_internet_service = cached_figure(figure_key, 'fig_churn_by_internet_service', lambda: px.bar(churn_by_internet_service, x='InternetService', y='Churn', title='Churn Rate by Internet Service'))
+                            st.plotly_chart(fig_churn_by_internet_service)
+
+                        with col2:
+                            # Plot: Churn Rate by Phone Service
+                            churn_by_phone_service = filtered_kpis.churn_rate_by('PhoneService')
+                            churn_by_phone_service['Churn'] = churn_by_phone_service['Churn'] * 100
+                            fig_churn_by_phone_service = cached_figure(figure_key, 'fig_churn_by_phone_service', lambda: px.bar(churn_by_phone_service, x='PhoneService', y='Churn', title='Churn Rate by Phone Service'))
+                            st.plotly_chart(fig_churn_by_phone_service)
+
+        show_churn_rate_comparisons()
 
         # Sample KPI data
         kpi_data = {
@@ -3,7 +3,7 @@ from streamlit_lottie import st_lottie
 import streamlit as st
 from utils.login import invoke_login_widget
 from utils.lottie import display_lottie_on_page
-import pandas as pd
+from utils.history_store import get_history_store
 import plotly.express as px
 import joblib
 import os
@@ -56,11 +56,37 @@ if st.session_state.get("authentication_status"):
     st.subheader("Business Insights")
     st.write("This section provides actionable insights derived from customer data analysis to help identify key trends, behaviors, and opportunities for growth.")
 
-    # Load Historical Data (Assuming a CSV without dates)
-    
-    data = pd.read_csv('./data/history.csv') # Replace with your
-
-    st.dataframe(data) # Replace with your actual data path
+    # Load Historical Data from the prediction history store, one page at a time
+    store = get_history_store()
+
+    runs = store.runs()
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        selected_model = st.selectbox('Model Used', options=[''] + store.models(), format_func=lambda x: 'All Models' if x == '' else x)
+    with col2:
+        selected_run = st.selectbox('Batch Run', options=[''] + runs['RunID'].tolist(), format_func=lambda x: 'All Predictions' if x == '' else x)
+    with col3:
+        page_size = st.selectbox('Rows per page', options=[25, 100, 500], index=1)
+
+    total_rows = store.count(selected_model, selected_run)
+    total_pages = max(1, -(-total_rows // page_size))
+    with col4:
+        page = st.number_input('Page', min_value=1, max_value=total_pages, value=1, step=1)
+
+    data = store.read_page(page, page_size, selected_model, selected_run)
+
+    st.dataframe(data)
+    st.caption(f"Showing page {page} of {total_pages} ({total_rows:,} predictions, most recent first)")
+
+    # Batch runs can be reviewed and removed as a unit
+    if not runs.empty:
+        with st.expander("🗂️ Batch Runs", expanded=False):
+            st.dataframe(runs.set_index('RunID'))
+            if selected_run and st.button(f"Delete run {selected_run}"):
+                deleted_rows = store.delete_run(selected_run)
+                st.success(f"Deleted {deleted_rows:,} predictions from run {selected_run}.")
+                st.rerun()
     # @st.cache_data(persist=True)
     # def load_historical_data():
     #     if os.path.exists('./data/history.csv'):
@@ -105,19 +131,38 @@ if st.session_state.get("authentication_status"):
 
     # Historical Analysis Section
     st.subheader("Historical Trends Analysis")
-    st.write("This section visualizes key trends over time, highlighting customer behavior and revenue generation.")
-
-    # Sample Visualization: Revenue over time (even without dates, can use index or other columns)
-    if 'Revenue' in data.columns:
-        fig1 = px.line(data, x=data.index, y='Revenue', title='Revenue Over Time', labels={'x': 'Index', 'Revenue': 'Revenue'})
-        st.plotly_chart(fig1, use_container_width=True)
-
-    # Additional Visualizations
-    if 'CustomerSegment' in data.columns:
-        customer_segment_counts = data['CustomerSegment'].value_counts().reset_index()
-        customer_segment_counts.columns = ['Customer Segment', 'Count']
-        fig2 = px.bar(customer_segment_counts, x='Customer Segment', y='Count', title='Customer Segmentation Distribution')
-        st.plotly_chart(fig2, use_container_width=True)
+    st.write("This section visualizes key trends over time, highlighting prediction volume and churn risk for each model.")
+
+    # Trends come from the daily pre-aggregates, so they do not rescan the prediction history
+    rollups = store.rollups()
+
+    if rollups.empty:
+        st.info("No predictions have been recorded yet.")
+    else:
+        # Key Metrics Overview
+        total_predictions = rollups['Predictions'].sum()
+        churn_share = (rollups['ChurnShare'] * rollups['Predictions']).sum() / total_predictions
+        with st.container():
+            left_col, middle_col, right_col = st.columns(3)
+            with left_col:
+                st.metric("Total Predictions", f"{total_predictions:,}")
+            with middle_col:
+                st.metric("Predicted Churn Share", f"{churn_share * 100:.2f}%")
+            with right_col:
+                st.metric("Models Used", rollups['ModelUsed'].nunique())
+
+        col1, col2 = st.columns(2)
+        with col1:
+            fig1 = px.bar(rollups, x='Day', y='Predictions', color='ModelUsed', title='Predictions per Day')
+            st.plotly_chart(fig1, use_container_width=True)
+        with col2:
+            fig2 = px.line(rollups, x='Day', y='ChurnShare', color='ModelUsed', markers=True, title='Predicted Churn Share per Day')
+            fig2.update_yaxes(tickformat='.0%')
+            st.plotly_chart(fig2, use_container_width=True)
+
+        fig3 = px.line(rollups, x='Day', y='MeanChurnProbability', color='ModelUsed', markers=True,
+                       title='Mean Churn Probability per Day (%)')
+        st.plotly_chart(fig3, use_container_width=True)
 
     st.write("---")
 
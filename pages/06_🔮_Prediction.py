@@ -1,10 +1,12 @@
 import streamlit as st
-import pandas as pd
 import numpy as np
-import joblib
 import datetime
-import os
+import uuid
 from utils.login import invoke_login_widget
+from utils.history_store import get_history_store
+from utils.model_registry import ModelRegistry
+from utils.scoring import prepare_batch, score_batch
+from utils.readers import read_upload
 
 # Invoke the login form
 invoke_login_widget('Future Projections')
@@ -21,15 +23,16 @@ if st.session_state.get("authentication_status"):
     st.title("Predictive Analytics")
 
 
-    # Load models
-    @st.cache_resource(show_spinner='Models Loading')
-    def models():
-        rf_model = joblib.load('./models/RF.joblib')
-        gb_model = joblib.load('./models/GB.joblib')
-        xgb_model = joblib.load('./models/XB.joblib')
-        return rf_model, gb_model, xgb_model
+    # Shared registry that loads each model on first use and keeps a bounded LRU of them
+    @st.cache_resource(show_spinner=False)
+    def model_registry():
+        # Created once per Streamlit process, the registry logs its startup memory
+        return ModelRegistry()
 
-    RF, GB, XB = models()
+    def format_bytes(size):
+        return 'n/a' if size is None else f"{size / 1024 ** 2:,.1f} MB"
+
+    registry = model_registry()
 
     # Initialize session state for selected model
     if 'selected_model' not in st.session_state:
@@ -42,17 +45,23 @@ if st.session_state.get("authentication_status"):
                                     key='selected_model',
                                     index=['Random Forest', 'GBoost', 'XGBoost'].index(st.session_state.selected_model))
     
-    # Get the selected model
-    @st.cache_resource(show_spinner='Loading models...')
+    # Get the selected model, loading it only when it is not resident yet
     def get_model(selected_model):
-        if selected_model == 'Random Forest':
-            pipeline = RF
-        elif selected_model == 'GBoost':
-            pipeline = GB
-        else:
-            pipeline = XB
-        encoder = joblib.load('./models/encoder.joblib')
-        return pipeline, encoder  
+        try:
+            if registry.is_loaded(selected_model):
+                pipeline = registry.get_model(selected_model)
+            else:
+                with st.spinner('Loading model...'):
+                    pipeline = registry.get_model(selected_model)
+        except FileNotFoundError as e:
+            st.error(f"Error: {e}")
+            st.stop()
+        encoder = registry.get_encoder()
+        return pipeline, encoder
+
+    # The single-record fast path is compiled once per resident model
+    def get_record_scorer(selected_model):
+        return registry.get_record_scorer(selected_model)
 
     # Initialize session state for predictions and probabilities
     if 'prediction' not in st.session_state:
@@ -61,7 +70,7 @@ if st.session_state.get("authentication_status"):
         st.session_state['probability'] = None
 
     # Prediction function
-    def make_prediction(pipeline, encoder):
+    def make_prediction(encoder, record_scorer):
         # Collect user input from session state
         user_input = {
             'gender': st.session_state['gender'],
@@ -85,16 +94,13 @@ if st.session_state.get("authentication_status"):
             'TotalCharges': st.session_state['total_charges'],
         }
 
-        # Convert the input data to a DataFrame
-        df = pd.DataFrame(user_input, index=[0])   
-        
-        # Make predictions
-        pred = pipeline.predict(df) 
-        pred_int = int(pred[0])   
+        # Score the record once, the label and the probabilities come from the same pass
+        pred, probabilities = record_scorer(user_input)
+        pred_int = int(pred)
         prediction = encoder.inverse_transform([[pred_int]])[0]
 
-        # Calculate the probability of churn
-        probability = pipeline.predict_proba(df)
+        # Keep the (1, n_classes) shape used by the results section below
+        probability = probabilities.reshape(1, -1)
         prediction_labels = "Churn" if pred == 1 else "No Churn"
 
         st.write(f'Predicted Churn: {prediction_labels}')
@@ -104,20 +110,21 @@ if st.session_state.get("authentication_status"):
         st.session_state['probability'] = probability
         st.session_state['prediction_labels'] = prediction_labels
 
-        # Copy the original dataframe to the new dataframe
-        hist_df = df.copy()
-        hist_df['PredictionTime'] = datetime.date.today()
-        hist_df['ModelUsed'] = st.session_state['selected_model']
-        hist_df['Prediction'] = prediction
-        hist_df['Probability'] = np.where(pred == 1, np.round(probability[:, 1] * 100, 2), np.round(probability[:, 0] * 100, 2))
-        
-        # Save the history dataframe to a CSV file
-        hist_df.to_csv('./data/history.csv', mode='a', header=not os.path.exists('./data/history.csv'), index=False)
+        # Build the history row from the submitted input
+        hist_row = dict(user_input)
+        hist_row['PredictionTime'] = datetime.date.today()
+        hist_row['ModelUsed'] = st.session_state['selected_model']
+        hist_row['Prediction'] = prediction
+        hist_row['Probability'] = round(float(probabilities[pred_int]) * 100, 2)
+
+        # Buffer the row in the history store, it is written in batches to SQLite
+        get_history_store().append(hist_row)
 
         return prediction, probability, prediction_labels
 
     def get_user_input():
-        pipeline, encoder = get_model(selected_model)
+        _, encoder = get_model(selected_model)
+        record_scorer = get_record_scorer(selected_model)
 
         with st.form('input-feature', clear_on_submit=True):
             col1, col2, col3 = st.columns(3)
@@ -148,7 +155,7 @@ if st.session_state.get("authentication_status"):
                 st.selectbox('Tech Support', options=['Yes', 'No'], key='tech_support')
                 st.selectbox('Streaming TV', options=['Yes', 'No'], key='streaming_tv')
                 st.selectbox('Streaming movies', options=['Yes', 'No'], key='streaming_movies')
-            submit = st.form_submit_button('Make Prediction', on_click=make_prediction, kwargs=dict(pipeline=pipeline, encoder=encoder))
+            submit = st.form_submit_button('Make Prediction', on_click=make_prediction, kwargs=dict(encoder=encoder, record_scorer=record_scorer))
             
     # if __name__ == "__main__":
     get_user_input()
@@ -166,6 +173,20 @@ if st.session_state.get("authentication_status"):
         probability_of_no = probability[0][0] * 100
         st.markdown(f'### The employee will not leave the company with a probability of {round(probability_of_no, 2)}%')
 
+    # Report the resident model memory of this process
+    memory = registry.memory_report()
+    resident_models = ', '.join(
+        f"{name} {format_bytes(info['size'])}{' (mapped)' if info['mmap'] else ''}" for name, info in memory['models'].items()
+    )
+    # Without /proc only the peak resident size of the process is known
+    resident = (f"resident {format_bytes(memory['rss'])}" if memory['rss'] is not None
+                else f"peak resident {format_bytes(memory['rss_peak'])}")
+    st.sidebar.caption(
+        f"Process {memory['pid']}: {resident}, "
+        f"private {format_bytes(memory['rss_anon'])}, file-backed {format_bytes(memory['rss_file'])}. "
+        f"Models: {resident_models or 'none loaded'}"
+    )
+
     # Sidebar for prediction input
     st.sidebar.header("Prediction Input")
     uploaded_file = st.sidebar.file_uploader("Upload your CSV or Excel file for prediction", type=["csv", "xlsx"])
@@ -196,10 +217,8 @@ if st.session_state.get("authentication_status"):
     def load_data(uploaded_file):
         if uploaded_file is not None:
             try:
-                if uploaded_file.name.endswith(".csv"):
-                    dfp = pd.read_csv(uploaded_file)
-                elif uploaded_file.name.endswith(".xlsx"):
-                    dfp = pd.read_excel(uploaded_file)
+                # Excel files go through the fastest available engine
+                dfp = read_upload(uploaded_file)
                 return dfp
             except Exception as e:
                 st.error(f"Error: {e}")
@@ -207,34 +226,29 @@ if st.session_state.get("authentication_status"):
         else:
             return None
 
+    # Report a batch run whose history write failed in the background after its page run ended
+    history_write = st.session_state.get('history_write')
+    if history_write is not None and history_write[1].done():
+        failed_run_id, future = st.session_state.pop('history_write')
+        if not future.cancelled() and future.exception() is not None:
+            st.error(f"Predictions of run {failed_run_id} could not be saved to history: {future.exception()}")
+
     dfp = load_data(uploaded_file)
 
     if dfp is not None:
         st.dataframe(dfp.head(3))
         if st.button("Predict on Uploaded Dataset"):
             pipeline, encoder = get_model(selected_model)
-            
-            # Convert 'TotalCharges' to numeric, coercing errors to NaN
-            dfp['TotalCharges'] = pd.to_numeric(dfp['TotalCharges'], errors='coerce')
-            
-            # Drop 'customerID' column
-            dfp = dfp.drop('customerID', axis=1)
-            
-            # Ensure 'tenure' has no zero or missing values
-            dfp['tenure'] = dfp['tenure'].replace(0, 1)
-            
-            # Ensure 'TotalCharges' has no zero or missing values
-            dfp['TotalCharges'] = dfp['TotalCharges'].replace(0, 1)
-            
-            # Identify object columns to convert to category datatype
-            object_columns_to_convert = dfp.select_dtypes(include=['object']).columns
-            
-            # Convert object columns to category datatype
-            dfp[object_columns_to_convert] = dfp[object_columns_to_convert].astype('category')
-            
-            # Make predictions
-            predictions = pipeline.predict(dfp)
-            probabilities = pipeline.predict_proba(dfp)
+
+            # Clean the uploaded data and score it in chunks with a single predict_proba pass
+            dfp = prepare_batch(dfp)
+            progress_bar = st.progress(0.0, text='Scoring uploaded dataset...')
+            predictions, probabilities, rows_per_second = score_batch(
+                pipeline, dfp, progress_callback=lambda fraction: progress_bar.progress(fraction, text='Scoring uploaded dataset...')
+            )
+            progress_bar.empty()
+            st.caption(f"Scored {len(dfp):,} rows at {rows_per_second:,.0f} rows/sec")
+
             prediction_labels = encoder.inverse_transform(predictions)
             dfp['Predicted Churn'] = prediction_labels
             
@@ -250,8 +264,10 @@ if st.session_state.get("authentication_status"):
             his_df['Prediction'] = predictions
             his_df['Probability'] = np.where(predictions == 1, np.round(probabilities[:, 1] * 100, 2), np.round(probabilities[:, 0] * 100, 2))
         
-            # Save the history dataframe to a CSV file
-            # his_df.to_csv('./data/History.csv', mode='a', header=not os.path.exists('./data/History.csv'), index=False)            
+            # Save the run to the history store in the background, tagged with a run ID
+            run_id = uuid.uuid4().hex[:12]
+            st.session_state['history_write'] = (run_id, get_history_store().append_run(his_df.assign(Prediction=prediction_labels), run_id))
+            st.caption(f"Saving {len(his_df):,} predictions to history under run ID {run_id}")
             #Display the predictions
             # st.dataframe(dfp)
             st.dataframe(his_df)  # or st.write("### Uploaded Dataset for Prediction", df) 
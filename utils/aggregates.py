@@ -0,0 +1,270 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+# Columns the KPI charts group by, each becomes a key of the cube. Tenure is left out, it has too
+# many values to share a key with the filter bins and gets a cube of its own
+CUBE_DIMENSIONS = ['Gender', 'Contract', 'PaymentMethod', 'InternetService', 'PhoneService']
+
+# Columns the KPIs average or total, summed per cell
+CUBE_MEASURES = ['Tenure', 'MonthlyCharges', 'TotalCharges']
+
+# Columns of the correlation heatmap, their sums and pairwise products are kept per cell
+CORRELATION_COLUMNS = ['Churn', 'MonthlyCharges', 'TotalCharges', 'Tenure']
+
+# Quantile bins per filter column. More bins mean fewer rows to re-check at a slider boundary,
+# at the cost of more cells
+CUBE_FILTER_BINS = 8
+
+# Slices kept per cube, keyed by the slider ranges
+MAX_CACHED_SLICES = 32
+
+
+def churn_flags(codes):
+    # Churn codes as (known, churned) flags, an unknown churn value (-1) counts towards neither
+    codes = np.asarray(codes)
+    return codes >= 0, codes == 1
+
+
+class CubeSlice:
+    # Cells that make up one filter selection, cells cut by a slider hold only their passing rows.
+    # Correlation moments are kept as totals over the selection, no chart splits them further
+    def __init__(self, labels, codes, weights, moment_columns, moments):
+        self._labels = labels
+        self._codes = codes
+        self._weights = weights
+        self._moment_columns = moment_columns
+        self._moments = moments
+
+    def total(self, weight):
+        return float(self._weights[weight].sum())
+
+    @property
+    def count(self):
+        return int(round(self.total('count')))
+
+    @property
+    def retained(self):
+        return int(round(self.total('churn_known') - self.total('churned')))
+
+    def churn_rate(self):
+        known = self.total('churn_known')
+        return self.total('churned') / known if known else np.nan
+
+    def mean(self, measure):
+        n = self.total(f"{measure} n")
+        return self.total(f"{measure} sum") / n if n else np.nan
+
+    def _by(self, dimension, weight):
+        # Weight totals per dimension value, in sorted value order, missing values left out
+        labels = self._labels[dimension]
+        codes = self._codes[dimension]
+        present = codes >= 0
+        return np.bincount(codes[present], weights=self._weights[weight][present], minlength=len(labels))
+
+    def value_counts(self, dimension):
+        counts = pd.Series(self._by(dimension, 'count'), index=self._labels[dimension], name='count')
+        counts = counts[counts > 0].round().astype(int)
+        counts.index.name = dimension
+        return counts.sort_values(ascending=False, kind='stable')
+
+    def churn_rate_by(self, dimension):
+        # Same frame as filtered_data.groupby(dimension)['Churn'].mean().reset_index()
+        counts = self._by(dimension, 'count')
+        known = self._by(dimension, 'churn_known')
+        churned = self._by(dimension, 'churned')
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rates = churned / known
+        present = counts > 0
+        return pd.DataFrame({dimension: self._labels[dimension][present], 'Churn': rates[present]})
+
+    def mean_by(self, dimension, measure):
+        # Same frame as filtered_data.groupby(dimension)[measure].mean().reset_index()
+        counts = self._by(dimension, 'count')
+        sums = self._by(dimension, f"{measure} sum")
+        n = self._by(dimension, f"{measure} n")
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = sums / n
+        present = counts > 0
+        return pd.DataFrame({dimension: self._labels[dimension][present], measure: means[present]})
+
+    def correlation(self, columns=None):
+        # Pearson correlation over the rows with all columns present, as df[columns].dropna().corr(),
+        # from the summed moments instead of the rows
+        columns = self._moment_columns if columns is None else list(columns)
+        positions = [self._moment_columns.index(column) for column in columns]
+        k = len(self._moment_columns)
+        n = self._moments[0]
+        sums = self._moments[1:k + 1][positions]
+        products = self._moments[k + 1:].reshape(k, k)[np.ix_(positions, positions)]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            covariance = products - np.outer(sums, sums) / n if n > 1 else np.full(products.shape, np.nan)
+            # A column that is constant over the selection has no correlation, rounding would leave
+            # a tiny variance instead of zero
+            variance = np.diag(covariance)
+            scale = np.where(variance > np.diag(products) * 1e-12, np.sqrt(np.abs(variance)), np.nan)
+            corr = covariance / np.outer(scale, scale)
+        np.fill_diagonal(corr, np.where(np.isnan(scale), np.nan, 1.0))
+        return pd.DataFrame(corr, index=columns, columns=columns)
+
+
+class ChurnCube:
+    # Counts, churn flags and measure sums per combination of dimension values and filter bins.
+    # Filters are answered from cells lying fully inside the slider ranges, only cells cut by a
+    # range boundary go back to their rows
+    def __init__(self, df, filter_columns, dimensions=CUBE_DIMENSIONS, measures=CUBE_MEASURES,
+                 correlation_columns=CORRELATION_COLUMNS, bins=CUBE_FILTER_BINS, max_cached=MAX_CACHED_SLICES):
+        self.n_rows = len(df)
+        self.max_cached = max_cached
+        self._slices = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Dimension codes follow sorted values, as groupby orders its groups; -1 marks a missing value
+        self._labels = {}
+        row_codes = {}
+        for dimension in dimensions:
+            codes, uniques = pd.factorize(df[dimension], sort=True)
+            row_codes[dimension] = codes
+            self._labels[dimension] = np.asarray(uniques)
+
+        known, churned = churn_flags(df['Churn'])
+        row_weights = {
+            'count': np.ones(self.n_rows),
+            'churn_known': known.astype(np.float64),
+            'churned': churned.astype(np.float64),
+        }
+        for measure in measures:
+            values = df[measure].to_numpy(dtype=np.float64, na_value=np.nan)
+            missing = np.isnan(values)
+            row_weights[f"{measure} sum"] = np.where(missing, 0.0, values)
+            row_weights[f"{measure} n"] = (~missing).astype(np.float64)
+
+        # Correlation columns are centred on their overall means, which keeps the summed products
+        # accurate. Rows missing any of them are zeroed and left out of the moment count
+        self._correlation_columns = list(correlation_columns)
+        moment_values = np.column_stack([
+            np.where(known, churned, np.nan) if column == 'Churn'
+            else df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+            for column in self._correlation_columns
+        ]) if self._correlation_columns else np.empty((self.n_rows, 0))
+        complete = ~np.isnan(moment_values).any(axis=1)
+        shift = moment_values[complete].mean(axis=0) if complete.any() else 0.0
+        moment_values = np.where(complete[:, None], moment_values - shift, 0.0)
+
+        # Filter columns are binned on their quantiles so each cell spans a narrow value range
+        filter_values = {}
+        keys = dict(row_codes)
+        for column in filter_columns:
+            values = df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+            filter_values[column] = values
+            edges = np.unique(np.nanquantile(values, np.linspace(0, 1, bins + 1))) if self.n_rows else []
+            keys[f"{column} bin"] = np.searchsorted(edges, values, side='right') if len(edges) else np.zeros(self.n_rows, dtype=int)
+
+        # The keys are packed into one integer per row, so a single sort both numbers the cells and
+        # brings the rows of each cell together. Codes are shifted up by one, -1 marks a missing value
+        packed = np.zeros(self.n_rows, dtype=np.int64)
+        for codes in keys.values():
+            codes = np.asarray(codes, dtype=np.int64) + 1
+            radix = int(codes.max()) + 1 if self.n_rows else 1
+            if self.n_rows and int(packed.max()) * radix >= 2 ** 62:
+                packed = np.unique(packed, return_inverse=True)[1].astype(np.int64)
+            packed = packed * radix + codes
+        order = np.argsort(packed, kind='stable')
+        first_of_cell = np.diff(packed[order], prepend=-1) != 0
+        self._row_cells = np.cumsum(first_of_cell) - 1
+        self.n_cells = int(first_of_cell.sum())
+
+        # Rows are kept in cell order, so the rows of any cell are one contiguous run and the
+        # boundary rows of a selection are read from a few runs instead of the whole table
+        starts = np.flatnonzero(first_of_cell)
+        self._sizes = np.diff(np.append(starts, self.n_rows))
+        self._weight_names = list(row_weights)
+        ordered_weights = [row_weights[weight][order] for weight in self._weight_names]
+        self._row_weights = np.column_stack(ordered_weights)
+        self._row_moments = moment_values[order]
+        self._row_complete = complete[order]
+        self._filter_values = {column: values[order] for column, values in filter_values.items()}
+
+        first_rows = order[starts] if self.n_cells else np.array([], dtype=int)
+        self._cell_codes = {dimension: codes[first_rows] for dimension, codes in row_codes.items()}
+
+        # Cell totals are summed column by column, reduceat runs fastest over contiguous arrays
+        k = len(self._correlation_columns)
+        self._cell_weights = np.zeros((self.n_cells, len(self._weight_names)))
+        self._cell_moments = np.zeros((self.n_cells, 1 + k + k * k))
+        if self.n_cells:
+            for i, values in enumerate(ordered_weights):
+                self._cell_weights[:, i] = np.add.reduceat(values, starts)
+            columns = [np.ascontiguousarray(self._row_moments[:, i]) for i in range(k)]
+            self._cell_moments[:, 0] = np.add.reduceat(self._row_complete.astype(np.float64), starts)
+            for i in range(k):
+                self._cell_moments[:, 1 + i] = np.add.reduceat(columns[i], starts)
+                for j in range(i, k):
+                    self._cell_moments[:, 1 + k + i * k + j] = self._cell_moments[:, 1 + k + j * k + i] = \
+                        np.add.reduceat(columns[i] * columns[j], starts)
+
+        # Value range of each filter column within each cell, rows with a missing value never pass a filter
+        self._cell_bounds = {}
+        for column, ordered in self._filter_values.items():
+            if self.n_cells:
+                low = np.fmin.reduceat(ordered, starts)
+                high = np.fmax.reduceat(ordered, starts)
+                has_missing = np.add.reduceat(np.isnan(ordered), starts) > 0
+            else:
+                low = high = np.array([])
+                has_missing = np.array([], dtype=bool)
+            self._cell_bounds[column] = (low, high, has_missing)
+
+    def _moment_sums(self, values, complete):
+        # Count, sums and pairwise products of the centred correlation columns over the given rows
+        return np.concatenate([[complete.sum()], values.sum(axis=0), (values.T @ values).ravel()])
+
+    def select(self, ranges=None):
+        ranges = {column: value for column, value in (ranges or {}).items() if column in self._cell_bounds}
+        key = tuple(sorted(ranges.items()))
+        with self._lock:
+            cube_slice = self._slices.get(key)
+            if cube_slice is not None:
+                self._slices.move_to_end(key)
+                return cube_slice
+
+            inside = np.ones(self.n_cells, dtype=bool)
+            touched = np.ones(self.n_cells, dtype=bool)
+            for column, (min_val, max_val) in list(ranges.items()):
+                low, high, has_missing = self._cell_bounds[column]
+                # A range covering every value of a complete column excludes nothing, its rows need
+                # no checking
+                if self.n_cells and min_val <= low.min() and max_val >= high.max() and not has_missing.any():
+                    del ranges[column]
+                    continue
+                inside &= (low >= min_val) & (high <= max_val) & ~has_missing
+                touched &= (high >= min_val) & (low <= max_val)
+
+            # Cells cut by a slider are settled row by row, and their passing rows are summed back
+            # into partial cells, so the slice holds one entry per cell either way
+            rows = np.flatnonzero(np.repeat(touched & ~inside, self._sizes))
+            if len(rows):
+                mask = np.ones(len(rows), dtype=bool)
+                for column, (min_val, max_val) in ranges.items():
+                    values = self._filter_values[column][rows]
+                    mask &= (values >= min_val) & (values <= max_val)
+                rows = rows[mask]
+
+            weights = self._cell_weights * inside[:, None]
+            moments = inside.astype(np.float64) @ self._cell_moments
+            if len(rows):
+                row_cells = self._row_cells[rows]
+                runs = np.flatnonzero(np.diff(row_cells, prepend=-1))
+                weights[row_cells[runs]] += np.add.reduceat(self._row_weights[rows], runs, axis=0)
+                moments = moments + self._moment_sums(self._row_moments[rows], self._row_complete[rows])
+
+            cells = np.flatnonzero(weights[:, 0] > 0)
+            codes = {dimension: cell_codes[cells] for dimension, cell_codes in self._cell_codes.items()}
+            weights = {weight: weights[cells, i] for i, weight in enumerate(self._weight_names)}
+            cube_slice = CubeSlice(self._labels, codes, weights, self._correlation_columns, moments)
+
+            self._slices[key] = cube_slice
+            while len(self._slices) > self.max_cached:
+                self._slices.popitem(last=False)
+            return cube_slice
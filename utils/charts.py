@@ -0,0 +1,143 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+import plotly.express as px
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+from utils.datasets import CHURN_LABELS
+
+# Points drawn by the scatter matrix, larger selections are sampled down to this within each churn
+# group. Set CHURN_SCATTER_POINT_BUDGET to change it
+SCATTER_POINT_BUDGET = int(os.environ.get('CHURN_SCATTER_POINT_BUDGET', 5000))
+
+# Figures are kept for reuse as their serialized JSON specs until the total size passes this budget
+FIGURE_CACHE_BYTES = 64 * 1024 * 1024
+
+_figures = OrderedDict()
+_figures_size = 0
+_figures_lock = threading.Lock()
+
+
+def cached_figure(cache_key, chart_id, build):
+    # The figure for chart_id under cache_key, which identifies the dataset and filter state. build
+    # only runs on a miss. The cache holds the JSON spec, which is immutable, and every call gets its
+    # own figure dict parsed from it. st.plotly_chart draws the dict as it would the Figure, and
+    # parsing it is far cheaper than validating a new go.Figure
+    global _figures_size
+    key = (cache_key, chart_id)
+    with _figures_lock:
+        spec = _figures.get(key)
+        if spec is not None:
+            _figures.move_to_end(key)
+            return json.loads(spec)
+    spec = pio.to_json(build(), validate=False)
+    if len(spec) <= FIGURE_CACHE_BYTES:
+        with _figures_lock:
+            if key not in _figures:
+                _figures[key] = spec
+                _figures_size += len(spec)
+            # Drop least recently shown figures until the cache fits its budget again
+            while _figures_size > FIGURE_CACHE_BYTES:
+                _, evicted = _figures.popitem(last=False)
+                _figures_size -= len(evicted)
+    return json.loads(spec)
+
+
+def _churn_colors(churn):
+    # Churn codes get the plotly colours in order of first appearance, as px does with color="Churn".
+    # Rows with an unknown churn value (-1) keep a series of their own, as they had with px
+    palette = px.colors.qualitative.Plotly
+    return {code: palette[i % len(palette)] for i, code in enumerate(pd.unique(churn))}
+
+
+def _layout(fig, column, title, barmode):
+    fig.update_layout(
+        title=title, barmode=barmode, bargap=0 if barmode == 'relative' else None,
+        xaxis_title=column, yaxis_title='count', legend_title_text='Churn'
+    )
+    return fig
+
+
+def _take(df, column, rows):
+    # One column at the filtered row positions, the frame itself is never copied
+    values = df[column]
+    return values if rows is None else values.iloc[rows]
+
+
+def churn_count_bars(df, column, title, rows=None):
+    # Same chart as px.histogram(df, x=column, color="Churn", barmode="group"), counted here so only
+    # one bar per value and churn group is sent to the browser
+    values = _take(df, column, rows)
+    churn = _take(df, 'Churn', rows).to_numpy()
+    counts = values.groupby([values, churn], observed=True).size().unstack(fill_value=0)
+    fig = go.Figure()
+    for code, color in _churn_colors(churn).items():
+        if code in counts.columns:
+            fig.add_trace(go.Bar(x=list(counts.index), y=counts[code].to_numpy(), name=CHURN_LABELS[code], marker_color=color))
+    return _layout(fig, column, title, 'group')
+
+
+def churn_histogram(df, column, nbins, title, rows=None):
+    # Same chart as px.histogram(df, x=column, nbins=nbins, color="Churn"), binned with np.histogram
+    # on edges shared by all churn groups
+    values = _take(df, column, rows).to_numpy(dtype=np.float64, na_value=np.nan)
+    present = ~np.isnan(values)
+    edges = np.histogram_bin_edges(values[present], bins=nbins) if present.any() else np.array([0.0, 1.0])
+    centers = (edges[:-1] + edges[1:]) / 2
+    widths = np.diff(edges)
+    churn = _take(df, 'Churn', rows).to_numpy()
+
+    fig = go.Figure()
+    for code, color in _churn_colors(churn).items():
+        counts, _ = np.histogram(values[present & (churn == code)], bins=edges)
+        fig.add_trace(go.Bar(x=centers, y=counts, width=widths, name=CHURN_LABELS[code], marker_color=color))
+    return _layout(fig, column, title, 'relative')
+
+
+def stratified_sample(codes, budget=SCATTER_POINT_BUDGET):
+    # Positions of a sample in which each code keeps its share of the budget, and at least one row,
+    # so a small churn group is not sampled away. The seed is fixed so a selection draws the same
+    # points on every rerun
+    if len(codes) <= budget:
+        return np.arange(len(codes))
+    _, codes = np.unique(codes, return_inverse=True)
+    sizes = np.bincount(codes)
+    quotas = np.maximum(sizes * budget // len(codes), 1)
+    order = np.argsort(codes, kind='stable')
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    rng = np.random.default_rng(0)
+    positions = np.concatenate([
+        order[start + rng.choice(size, quota, replace=False)]
+        for start, size, quota in zip(starts, sizes, quotas)
+    ])
+    return np.sort(positions)
+
+
+def churn_scatter_matrix(df, dimensions, title, rows=None, budget=SCATTER_POINT_BUDGET):
+    # Pair plot of dimensions coloured by Churn, drawn with WebGL Scattergl traces from a stratified
+    # sample, so the payload and the browser work stay bounded however large the selection is
+    churn = _take(df, 'Churn', rows).to_numpy()
+    sample = stratified_sample(churn, budget)
+    churn = churn[sample]
+    columns = {dimension: _take(df, dimension, rows).to_numpy(dtype=np.float32)[sample] for dimension in dimensions}
+    n = len(dimensions)
+    fig = make_subplots(rows=n, cols=n, shared_xaxes=True, shared_yaxes=True,
+                        horizontal_spacing=0.02, vertical_spacing=0.02)
+    for code, color in _churn_colors(churn).items():
+        in_group = churn == code
+        for i, y in enumerate(dimensions):
+            for j, x in enumerate(dimensions):
+                fig.add_trace(go.Scattergl(
+                    x=columns[x][in_group], y=columns[y][in_group], mode='markers',
+                    marker=dict(color=color, size=3), name=CHURN_LABELS[code], legendgroup=CHURN_LABELS[code],
+                    showlegend=(i == 0 and j == 0)
+                ), row=i + 1, col=j + 1)
+    for k, dimension in enumerate(dimensions):
+        fig.update_xaxes(title_text=dimension, row=n, col=k + 1)
+        fig.update_yaxes(title_text=dimension, row=k + 1, col=1)
+    fig.update_layout(title=title, legend_title_text='Churn')
+    return fig
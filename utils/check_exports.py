@@ -0,0 +1,18 @@
+# Usage: python utils/check_exports.py [csv_file]
+import os
+import sys
+import pandas as pd
+from io import BytesIO
+
+# Run as a script from the repository root, the utils package is imported from there
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.exports import export_bytes
+
+# Get the CSV file to export from the command line, defaulting to the template dataset
+csv_file_path = sys.argv[1] if len(sys.argv) > 1 else './data/LP2_train_final.csv'
+
+# Export the frame and read it back, every cell has to survive the round trip
+df = pd.read_csv(csv_file_path)
+exported = pd.read_excel(BytesIO(export_bytes(df, 'excel')))
+pd.testing.assert_frame_equal(exported, df, check_dtype=False)
+print(f"Excel export of {csv_file_path}: {len(df)} rows, {len(df.columns)} columns match")
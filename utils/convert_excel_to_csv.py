@@ -1,12 +1,17 @@
-import pandas as pd
+# Usage: python utils/convert_excel_to_csv.py <excel_file> <csv_file>
+import os
 import sys
 
+# Run as a script from the repository root, the utils package is imported from there
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.readers import read_excel
+
 # Get the Excel file path and the CSV file path from command line arguments
 excel_file_path = sys.argv[1]
 csv_file_path = sys.argv[2]
 
-# Read the Excel file
-df = pd.read_excel(excel_file_path)
+# Read the Excel file with the fastest available engine
+df = read_excel(excel_file_path)
 
 # Write the DataFrame to a CSV file
 df.to_csv(csv_file_path, index=False)
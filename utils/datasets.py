@@ -0,0 +1,85 @@
+import os
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from utils.schema import SCHEMA_REVISION, apply_schema
+from utils.readers import to_numeric_or_keep
+
+TEMPLATE_CSV_PATH = './data/LP2_train_final.csv'
+CACHE_DIR = './data/.cache'
+
+# Text columns with fewer distinct values than this share of rows are stored as categoricals
+CATEGORICAL_MAX_UNIQUE_RATIO = 0.5
+
+# Churn is held as int8 codes with these labels, -1 marks a missing or unrecognised value
+CHURN_LABELS = {0: 'No', 1: 'Yes', -1: 'Unknown'}
+
+# In-process memo of loaded Arrow tables, keyed by source path
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def encode_churn(series):
+    codes = np.full(len(series), -1, dtype=np.int8)
+    for code, label in CHURN_LABELS.items():
+        codes[(series == label).to_numpy()] = code
+    return pd.Series(codes, index=series.index, name=series.name)
+
+
+def to_typed_frame(df):
+    # Coerce numeric-looking columns and store repeated text values as categoricals, the template
+    # columns then take their declared dtypes
+    df = df.apply(to_numeric_or_keep)
+    categorical_columns = [
+        column for column in df.select_dtypes(include=['object']).columns
+        if df[column].nunique() < len(df) * CATEGORICAL_MAX_UNIQUE_RATIO
+    ]
+    return apply_schema(df.astype({column: 'category' for column in categorical_columns}))
+
+
+def _build_cache(source_path, cache_path):
+    # Parse the source once and write the typed frame as Feather (Arrow IPC), atomically
+    table = pa.Table.from_pandas(to_typed_frame(pd.read_csv(source_path)), preserve_index=False)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    feather.write_feather(table, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, cache_path)
+
+
+def load_cached_csv(source_path, cache_dir=CACHE_DIR):
+    stat = os.stat(source_path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+
+    with _tables_lock:
+        cached = _tables.get(source_path)
+        if cached is None or cached[0] != signature:
+            # The cache file is named by content hash and schema revision, so touching the source
+            # without changing it reuses the existing cache
+            name = os.path.splitext(os.path.basename(source_path))[0]
+            cache_path = os.path.join(cache_dir, f"{name}.{file_sha256(source_path)[:16]}.s{SCHEMA_REVISION}.feather")
+            if not os.path.exists(cache_path):
+                # Drop caches of earlier versions of the source before building the new one
+                for old_file in os.listdir(cache_dir) if os.path.isdir(cache_dir) else []:
+                    if old_file.startswith(f"{name}.") and old_file.endswith('.feather'):
+                        os.remove(os.path.join(cache_dir, old_file))
+                _build_cache(source_path, cache_path)
+            # Uncompressed Feather is memory-mapped, so numeric columns are read without copying
+            cached = (signature, feather.read_table(cache_path, memory_map=True))
+            _tables[source_path] = cached
+
+    return cached[1].to_pandas()
+
+
+def load_template_dataset():
+    return load_cached_csv(TEMPLATE_CSV_PATH)
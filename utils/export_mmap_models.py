@@ -0,0 +1,12 @@
+import sys
+from utils.model_registry import MMAP_DIR, MODEL_PATHS, export_mmap_artifact
+
+# Get the model files to export from command line arguments, defaulting to every registered model
+model_paths = sys.argv[1:] or list(MODEL_PATHS.values())
+
+# Write uncompressed copies that can be loaded with CHURN_MODELS_MMAP_MODE=r
+for model_path in model_paths:
+    try:
+        print(f"{model_path} -> {export_mmap_artifact(model_path, MMAP_DIR)}")
+    except FileNotFoundError:
+        print(f"{model_path} not found, skipped")
@@ -0,0 +1,94 @@
+import gzip
+import threading
+from io import BytesIO
+from collections import OrderedDict
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Rows serialized per step for the formats that can be written incrementally
+EXPORT_CHUNK_ROWS = 50000
+
+# Generated files are kept for repeated downloads until their total size passes this budget
+EXPORT_CACHE_BYTES = 256 * 1024 * 1024
+
+_exports = OrderedDict()
+_exports_lock = threading.Lock()
+
+
+def _chunks(df, chunksize):
+    for start in range(0, len(df), chunksize):
+        yield df.iloc[start:start + chunksize]
+
+
+def _to_excel(df, buffer):
+    # Not in constant_memory mode: to_excel writes column by column, and xlsxwriter would drop
+    # every cell written to a row it had already flushed
+    with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
+        df.to_excel(writer, index=False, sheet_name='Sheet1')
+
+
+def _to_stata(df, buffer):
+    df.to_stata(buffer, write_index=False)
+
+
+def _to_html(df, buffer):
+    buffer.write(df.to_html(index=False).encode('utf-8'))
+
+
+def _to_json(df, buffer):
+    # One records array, written chunk by chunk
+    buffer.write(b'[')
+    for i, chunk in enumerate(_chunks(df, EXPORT_CHUNK_ROWS)):
+        records = chunk.to_json(orient='records')[1:-1]
+        if records:
+            if i:
+                buffer.write(b',')
+            buffer.write(records.encode('utf-8'))
+    buffer.write(b']')
+
+
+def _to_parquet(df, buffer):
+    # One schema for the whole frame, written in row groups of EXPORT_CHUNK_ROWS
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_table(table, buffer, row_group_size=EXPORT_CHUNK_ROWS, compression='snappy')
+
+
+def _to_csv_gzip(df, buffer):
+    with gzip.GzipFile(fileobj=buffer, mode='wb') as compressed:
+        for i, chunk in enumerate(_chunks(df, EXPORT_CHUNK_ROWS)):
+            compressed.write(chunk.to_csv(index=False, header=(i == 0)).encode('utf-8'))
+
+
+# Download formats: button label, file name, MIME type and writer
+EXPORT_FORMATS = {
+    'excel': ("Download as Excel", "data.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", _to_excel),
+    'stata': ("Download as Stata", "data.dta", "application/x-stata", _to_stata),
+    'html': ("Download as HTML", "data.html", "text/html", _to_html),
+    'json': ("Download as JSON", "data.json", "application/json", _to_json),
+    'parquet': ("Download as Parquet", "data.parquet", "application/vnd.apache.parquet", _to_parquet),
+    'csv_gzip': ("Download as CSV (gzip)", "data.csv.gz", "application/gzip", _to_csv_gzip),
+}
+
+
+def export_bytes(df, export_format, cache_key=None):
+    # Serialize df in the requested format, reusing an earlier result for the same cache key
+    key = (cache_key, export_format)
+    if cache_key is not None:
+        with _exports_lock:
+            data = _exports.get(key)
+            if data is not None:
+                _exports.move_to_end(key)
+                return data
+
+    buffer = BytesIO()
+    EXPORT_FORMATS[export_format][3](df, buffer)
+    data = buffer.getvalue()
+
+    if cache_key is not None and len(data) <= EXPORT_CACHE_BYTES:
+        with _exports_lock:
+            _exports[key] = data
+            # Drop least recently downloaded files until the cache fits its budget again
+            while sum(len(value) for value in _exports.values()) > EXPORT_CACHE_BYTES:
+                _exports.popitem(last=False)
+    return data
@@ -0,0 +1,108 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+# Filter results kept per dataset, keyed by the full filter state
+MAX_CACHED_SELECTIONS = 32
+
+
+class FilterIndex:
+    def __init__(self, df, max_cached=MAX_CACHED_SELECTIONS):
+        self.n_rows = len(df)
+        self.max_cached = max_cached
+        self._df = df
+        self._sorted = {}
+        self._codes = {}
+        self._bounds = {}
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        # pandas keeps a hash table on the index, so a customer lookup is not a scan
+        self._customers = pd.Index(df.index)
+        self.customer_options = [''] + list(self._customers.unique())
+
+    def bounds(self, column):
+        # Slider limits, computed once per column
+        if column not in self._bounds:
+            values = self._df[column]
+            self._bounds[column] = (values.min(), values.max())
+        return self._bounds[column]
+
+    def values(self, column):
+        # Distinct values in order of first appearance, the codes of each row are kept for lookups
+        return list(self._factorize(column)[1])
+
+    def _factorize(self, column):
+        if column not in self._codes:
+            codes, uniques = pd.factorize(self._df[column])
+            self._codes[column] = (codes, uniques, {value: code for code, value in enumerate(uniques)})
+        return self._codes[column]
+
+    def _sorted_index(self, column, values):
+        # Row positions ordered by value, built the first time the column is filtered on
+        if column not in self._sorted:
+            order = np.argsort(values, kind='stable')
+            if self.n_rows < np.iinfo(np.int32).max:
+                order = order.astype(np.int32)
+            self._sorted[column] = (order, values[order])
+        return self._sorted[column]
+
+    def _predicates(self, ranges, equals):
+        # Each predicate is an inclusive value range over a column array
+        predicates = []
+        for column, (low, high) in ranges.items():
+            min_value, max_value = self.bounds(column)
+            if low <= min_value and high >= max_value:
+                # A slider at its full range does not exclude anything
+                continue
+            predicates.append((column, self._df[column].to_numpy(), low, high))
+        for column, value in equals.items():
+            codes, _, lookup = self._factorize(column)
+            code = lookup.get(value, -2)
+            predicates.append((f"{column} codes", codes, code, code))
+        return predicates
+
+    def select(self, ranges=None, equals=None, customer_id=None):
+        ranges = ranges or {}
+        equals = equals or {}
+        key = (tuple(sorted(ranges.items())), tuple(sorted(equals.items(), key=str)), customer_id)
+        with self._lock:
+            positions = self._results.get(key)
+            if positions is not None:
+                self._results.move_to_end(key)
+                return positions
+
+            predicates = self._predicates(ranges, equals)
+            if customer_id is not None:
+                positions = self._customers.get_indexer_for([customer_id])
+                positions = positions[positions >= 0]
+            elif predicates:
+                # Start from the most selective predicate, read off its sorted index
+                spans = []
+                for column, values, low, high in predicates:
+                    order, sorted_values = self._sorted_index(column, values)
+                    start = np.searchsorted(sorted_values, low, side='left')
+                    stop = np.searchsorted(sorted_values, high, side='right')
+                    spans.append((stop - start, order, start, stop))
+                seed = int(np.argmin([span[0] for span in spans]))
+                _, order, start, stop = spans[seed]
+                positions = np.sort(order[start:stop])
+                del predicates[seed]
+            else:
+                positions = np.arange(self.n_rows)
+
+            # The remaining predicates are combined into one mask over the candidate rows
+            if predicates and len(positions):
+                mask = np.ones(len(positions), dtype=bool)
+                for _, values, low, high in predicates:
+                    candidate_values = values[positions]
+                    mask &= (candidate_values >= low) & (candidate_values <= high)
+                positions = positions[mask]
+
+            self._results[key] = positions
+            while len(self._results) > self.max_cached:
+                self._results.popitem(last=False)
+            return positions
+
+    def filter(self, ranges=None, equals=None, customer_id=None):
+        return self._df.iloc[self.select(ranges, equals, customer_id)]
@@ -0,0 +1,348 @@
+import os
+import atexit
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+HISTORY_DB_PATH = './data/history.db'
+LEGACY_HISTORY_CSV_PATH = './data/history.csv'
+
+# Columns recorded for every prediction, in the order of the legacy history.csv
+FEATURE_COLUMNS = [
+    'gender', 'SeniorCitizen', 'Partner', 'Dependents', 'tenure', 'PhoneService', 'MultipleLines',
+    'InternetService', 'OnlineSecurity', 'OnlineBackup', 'DeviceProtection', 'TechSupport',
+    'StreamingTV', 'StreamingMovies', 'Contract', 'PaperlessBilling', 'PaymentMethod',
+    'MonthlyCharges', 'TotalCharges',
+]
+HISTORY_COLUMNS = FEATURE_COLUMNS + ['PredictionTime', 'ModelUsed', 'Prediction', 'Probability', 'RunID']
+NUMERIC_COLUMNS = {'tenure', 'MonthlyCharges', 'TotalCharges', 'Probability'}
+
+# Buffered rows are written once this many are pending, or after FLUSH_INTERVAL seconds
+FLUSH_ROWS = 50
+FLUSH_INTERVAL = 2.0
+
+# Rows per executemany call when a batch run is written
+BULK_WRITE_ROWS = 10000
+
+# Daily pre-aggregates per model, applied to the predictions matched by {condition}. Probability
+# holds the confidence in the predicted class, so it is turned into a churn probability first
+ROLLUP_UPSERT = """
+INSERT INTO history_daily (day, ModelUsed, predictions, churn, probability_count, probability_sum)
+SELECT COALESCE(substr(PredictionTime, 1, 10), ''), COALESCE(ModelUsed, ''),
+       ? * COUNT(*),
+       ? * COALESCE(SUM(Prediction = 'Yes'), 0),
+       ? * COUNT(Probability),
+       ? * COALESCE(SUM(CASE WHEN Prediction = 'Yes' THEN Probability ELSE 100 - Probability END), 0)
+FROM predictions WHERE {condition} GROUP BY 1, 2
+ON CONFLICT (day, ModelUsed) DO UPDATE SET
+    predictions = predictions + excluded.predictions,
+    churn = churn + excluded.churn,
+    probability_count = probability_count + excluded.probability_count,
+    probability_sum = probability_sum + excluded.probability_sum;
+"""
+
+# One summary row per batch run, merged with the predictions matched by {condition}
+RUNS_UPSERT = """
+INSERT INTO history_runs (RunID, first_id, PredictionTime, ModelUsed, row_count)
+SELECT RunID, MIN(id), MIN(PredictionTime), MIN(ModelUsed), COUNT(*)
+FROM predictions WHERE RunID IS NOT NULL AND {condition} GROUP BY RunID
+ON CONFLICT (RunID) DO UPDATE SET
+    first_id = MIN(first_id, excluded.first_id),
+    PredictionTime = COALESCE(MIN(PredictionTime, excluded.PredictionTime), PredictionTime, excluded.PredictionTime),
+    ModelUsed = COALESCE(MIN(ModelUsed, excluded.ModelUsed), ModelUsed, excluded.ModelUsed),
+    row_count = row_count + excluded.row_count;
+"""
+
+
+def connect(db_path=HISTORY_DB_PATH):
+    conn = sqlite3.connect(db_path, timeout=30)
+    # WAL lets the History page read while a prediction session is writing
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    return conn
+
+
+class HistoryStore:
+    def __init__(self, db_path=HISTORY_DB_PATH, legacy_csv_path=LEGACY_HISTORY_CSV_PATH,
+                 flush_rows=FLUSH_ROWS, flush_interval=FLUSH_INTERVAL):
+        self.db_path = db_path
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+        # Batch runs are written by a single background thread, one run at a time
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='history-writer')
+        self._create_schema(legacy_csv_path)
+        atexit.register(self.flush)
+
+    def _create_schema(self, legacy_csv_path):
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        column_definitions = ', '.join(
+            f'"{column}" {"REAL" if column in NUMERIC_COLUMNS else "TEXT"}' for column in HISTORY_COLUMNS
+        )
+        conn = connect(self.db_path)
+        try:
+            with conn:
+                conn.execute(f"CREATE TABLE IF NOT EXISTS predictions (id INTEGER PRIMARY KEY, {column_definitions});")
+                existing_columns = {row[1] for row in conn.execute("PRAGMA table_info(predictions);")}
+                if 'RunID' not in existing_columns:
+                    conn.execute('ALTER TABLE predictions ADD COLUMN "RunID" TEXT;')
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_predictions_time ON predictions (PredictionTime);")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_predictions_model ON predictions (ModelUsed);")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_predictions_run ON predictions (RunID);")
+                conn.execute("CREATE TABLE IF NOT EXISTS history_meta (key TEXT PRIMARY KEY, value TEXT);")
+                conn.execute("""
+                CREATE TABLE IF NOT EXISTS history_daily (
+                    day TEXT, ModelUsed TEXT, predictions INTEGER, churn INTEGER,
+                    probability_count INTEGER, probability_sum REAL,
+                    PRIMARY KEY (day, ModelUsed)
+                );
+                """)
+                conn.execute("""
+                CREATE TABLE IF NOT EXISTS history_runs (
+                    RunID TEXT PRIMARY KEY, first_id INTEGER, PredictionTime TEXT, ModelUsed TEXT, row_count INTEGER
+                );
+                """)
+
+                # Import the legacy CSV history once, in the same transaction that records it
+                migrated = conn.execute("SELECT 1 FROM history_meta WHERE key = 'legacy_csv_migrated';").fetchone()
+                if not migrated:
+                    if os.path.exists(legacy_csv_path):
+                        legacy_df = pd.read_csv(legacy_csv_path)
+                        self._insert(conn, _frame_rows(legacy_df))
+                    conn.execute("INSERT INTO history_meta (key, value) VALUES ('legacy_csv_migrated', '1');")
+
+                # Build the daily rollups from existing predictions once, later writes keep them current
+                rollups_built = conn.execute("SELECT 1 FROM history_meta WHERE key = 'rollups_built';").fetchone()
+                if not rollups_built:
+                    conn.execute("DELETE FROM history_daily;")
+                    _update_rollups(conn, "1 = 1", ())
+                    conn.execute("INSERT INTO history_meta (key, value) VALUES ('rollups_built', '1');")
+
+                # Same for the batch run summaries
+                runs_built = conn.execute("SELECT 1 FROM history_meta WHERE key = 'runs_built';").fetchone()
+                if not runs_built:
+                    conn.execute("DELETE FROM history_runs;")
+                    _update_runs(conn, "1 = 1", ())
+                    conn.execute("INSERT INTO history_meta (key, value) VALUES ('runs_built', '1');")
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _insert(conn, rows):
+        # Rows are sequences of values in HISTORY_COLUMNS order
+        placeholders = ', '.join('?' for _ in HISTORY_COLUMNS)
+        columns = ', '.join(f'"{column}"' for column in HISTORY_COLUMNS)
+        conn.executemany(f"INSERT INTO predictions ({columns}) VALUES ({placeholders});", rows)
+
+    @staticmethod
+    def _last_id(conn):
+        # Take the write lock first, so no other writer can insert between this read and our rows
+        conn.execute("BEGIN IMMEDIATE;")
+        return conn.execute("SELECT COALESCE(MAX(id), 0) FROM predictions;").fetchone()[0]
+
+    def append(self, row):
+        with self._lock:
+            self._buffer.append(row)
+            pending = len(self._buffer)
+            if pending < self.flush_rows and self._timer is None:
+                # Make sure a lone prediction still reaches the database shortly
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if pending >= self.flush_rows:
+            self.flush()
+
+    def flush(self):
+        # The buffer is swapped out under _lock, so appends never wait on the write. Flushes write
+        # one at a time under _flush_lock, and a read that flushes waits for a write in progress
+        with self._flush_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if not rows:
+                return
+            conn = connect(self.db_path)
+            try:
+                # One transaction per flush, so concurrent sessions never interleave partial rows
+                with conn:
+                    last_id = self._last_id(conn)
+                    self._insert(conn, ([_to_sql_value(row.get(column)) for column in HISTORY_COLUMNS] for row in rows))
+                    # Only the rows just inserted are aggregated into the rollups and run summaries
+                    _update_rollups(conn, "id > ?", (last_id,))
+                    _update_runs(conn, "id > ?", (last_id,))
+            finally:
+                conn.close()
+
+    def append_run(self, df, run_id):
+        # Hand a whole batch run to the background writer and return its future. A failed write is
+        # logged here, callers can also check the future to tell the user
+        frame = df.reindex(columns=HISTORY_COLUMNS).assign(RunID=run_id)
+        future = self._writer.submit(self._write_run, frame)
+        future.add_done_callback(lambda done: _log_failed_run(done, run_id))
+        return future
+
+    def _write_run(self, frame):
+        conn = connect(self.db_path)
+        try:
+            # The whole run is committed in one transaction, in slices of BULK_WRITE_ROWS rows
+            with conn:
+                last_id = self._last_id(conn)
+                for start in range(0, len(frame), BULK_WRITE_ROWS):
+                    self._insert(conn, _frame_rows(frame.iloc[start:start + BULK_WRITE_ROWS]))
+                _update_rollups(conn, "id > ?", (last_id,))
+                _update_runs(conn, "id > ?", (last_id,))
+        finally:
+            conn.close()
+        return len(frame)
+
+    def runs(self):
+        # Read from the run summaries kept by every write, not by grouping the predictions
+        self.flush()
+        query = """
+        SELECT RunID, PredictionTime, ModelUsed, row_count AS Rows
+        FROM history_runs ORDER BY first_id DESC;
+        """
+        conn = connect(self.db_path)
+        try:
+            return pd.read_sql_query(query, conn)
+        finally:
+            conn.close()
+
+    def delete_run(self, run_id):
+        conn = connect(self.db_path)
+        try:
+            with conn:
+                # Take the run back out of the rollups before deleting its rows
+                _update_rollups(conn, "RunID = ?", (run_id,), sign=-1)
+                conn.execute("DELETE FROM history_daily WHERE predictions <= 0;")
+                conn.execute("DELETE FROM history_runs WHERE RunID = ?;", (run_id,))
+                return conn.execute("DELETE FROM predictions WHERE RunID = ?;", (run_id,)).rowcount
+        finally:
+            conn.close()
+
+    def count(self, model=None, run_id=None):
+        # Counts for all predictions, one model or one run come from the summary tables, only a
+        # model within a run is counted from the predictions themselves
+        self.flush()
+        if run_id and model:
+            where, params = _where(model, run_id)
+            query = f"SELECT COUNT(*) FROM predictions {where};"
+        elif run_id:
+            query, params = "SELECT COALESCE(SUM(row_count), 0) FROM history_runs WHERE RunID = ?;", [run_id]
+        elif model:
+            query, params = "SELECT COALESCE(SUM(predictions), 0) FROM history_daily WHERE ModelUsed = ?;", [model]
+        else:
+            query, params = "SELECT COALESCE(SUM(predictions), 0) FROM history_daily;", []
+        conn = connect(self.db_path)
+        try:
+            return conn.execute(query, params).fetchone()[0]
+        finally:
+            conn.close()
+
+    def read_page(self, page=1, page_size=100, model=None, run_id=None):
+        # Most recent predictions first
+        self.flush()
+        where, params = _where(model, run_id)
+        columns = ', '.join(f'"{column}"' for column in HISTORY_COLUMNS)
+        query = f"SELECT {columns} FROM predictions {where} ORDER BY id DESC LIMIT ? OFFSET ?;"
+        conn = connect(self.db_path)
+        try:
+            return pd.read_sql_query(query, conn, params=params + [page_size, (page - 1) * page_size])
+        finally:
+            conn.close()
+
+    def rollups(self):
+        # Daily counts, churn share and mean churn probability per model, read from the pre-aggregates
+        self.flush()
+        query = """
+        SELECT day AS Day, ModelUsed, predictions AS Predictions,
+               CAST(churn AS REAL) / predictions AS ChurnShare,
+               probability_sum / NULLIF(probability_count, 0) AS MeanChurnProbability
+        FROM history_daily ORDER BY day, ModelUsed;
+        """
+        conn = connect(self.db_path)
+        try:
+            return pd.read_sql_query(query, conn)
+        finally:
+            conn.close()
+
+    def models(self):
+        self.flush()
+        conn = connect(self.db_path)
+        try:
+            # The daily rollups hold every model that has predictions, in far fewer rows
+            query = "SELECT DISTINCT ModelUsed FROM history_daily WHERE ModelUsed != '' ORDER BY ModelUsed;"
+            return [row[0] for row in conn.execute(query)]
+        finally:
+            conn.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_history_store():
+    # One store per process, shared by the Prediction and History pages so that
+    # reads flush the rows other sessions have buffered
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore()
+        return _store
+
+
+def _update_rollups(conn, condition, params, sign=1):
+    conn.execute(ROLLUP_UPSERT.format(condition=condition), (sign, sign, sign, sign) + tuple(params))
+
+
+def _update_runs(conn, condition, params):
+    conn.execute(RUNS_UPSERT.format(condition=condition), tuple(params))
+
+
+def _log_failed_run(future, run_id):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Saving batch run %s to the prediction history failed", run_id, exc_info=future.exception())
+
+
+def _where(model=None, run_id=None):
+    conditions, params = [], []
+    if model:
+        conditions.append("ModelUsed = ?")
+        params.append(model)
+    if run_id:
+        conditions.append("RunID = ?")
+        params.append(run_id)
+    return ("WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+
+def _frame_rows(df):
+    # Convert column by column, then zip the columns into rows for executemany
+    frame = df.reindex(columns=HISTORY_COLUMNS)
+    columns = []
+    for column in HISTORY_COLUMNS:
+        values = frame[column]
+        if column == 'PredictionTime':
+            values = values.map(_to_sql_value, na_action='ignore')
+        values = values.astype(object).where(values.notna(), None)
+        columns.append(values.tolist())
+    return zip(*columns)
+
+
+def _to_sql_value(value):
+    # Store dates as ISO strings and unwrap NumPy scalars for sqlite3
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
@@ -0,0 +1,216 @@
+import time
+import hashlib
+import threading
+from io import BytesIO
+from uuid import uuid4
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from openpyxl import load_workbook
+from utils.user_db import get_user_database
+from utils.readers import iter_upload_chunks, read_header, to_template_types
+from utils.schema import declared_dtype
+
+# Rows parsed, validated and written per step, bounding peak memory for large uploads
+INGEST_CHUNK_ROWS = 50000
+
+
+class TemplateMismatchError(ValueError):
+    pass
+
+
+def validate_chunk(chunk, template_df):
+    # Compare column names
+    if list(chunk.columns) != list(template_df.columns):
+        return False
+
+    # Compare column kinds, a column that is empty in this chunk fits either kind
+    for column in template_df.columns:
+        values = chunk[column]
+        if values.isna().all():
+            continue
+        if pd.api.types.is_numeric_dtype(template_df[column]) != pd.api.types.is_numeric_dtype(values):
+            return False
+
+    return True
+
+
+def upload_sha256(file):
+    return hashlib.sha256(file.getbuffer()).hexdigest()
+
+
+def next_table_name(db_path, username):
+    # Filter tables to find those that match the user's naming pattern
+    existing_tables = get_user_database(db_path).tables()
+    user_tables = [table for table in existing_tables if table.startswith(f"{username}_table")]
+
+    if user_tables:
+        # Extract the numeric part, convert to integer, and find the max value
+        max_table_num = max([int(table.split(f"{username}_table")[1]) for table in user_tables])
+        next_table_num = max_table_num + 1
+    else:
+        next_table_num = 1
+
+    # Pad the table number with leading zeros based on the length of the highest table number
+    pad_length = len(str(next_table_num))
+    return f"{username}_table{str(next_table_num).zfill(pad_length)}"
+
+
+def estimate_rows(file):
+    # Data rows in the upload, used only to report progress
+    file.seek(0)
+    if file.name.endswith('.xlsx'):
+        workbook = load_workbook(file, read_only=True)
+        try:
+            max_row = workbook.worksheets[0].max_row
+        finally:
+            workbook.close()
+        return max(max_row - 1, 0) if max_row else None
+    return max(file.getvalue().count(b'\n') - 1, 0)
+
+
+def _sql_type(dtype):
+    if pd.api.types.is_integer_dtype(dtype):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'REAL'
+    return 'TEXT'
+
+
+def ingest_upload(file, db_path, table_name, template_df, chunksize=INGEST_CHUNK_ROWS, content_hash=None,
+                  progress_callback=None):
+    columns = list(template_df.columns)
+    # Column types follow the declared schema, the template frame covers any column it does not declare
+    column_definitions = ', '.join(
+        f'"{column}" {_sql_type(declared_dtype(column) or template_df[column].dtype)}' for column in columns
+    )
+    placeholders = ', '.join('?' for _ in columns)
+
+    # Only the template columns are read, a file missing any of them is rejected before its rows are parsed
+    header = read_header(file)
+    missing_columns = [column for column in columns if column not in header]
+    if missing_columns:
+        raise TemplateMismatchError(f"Missing columns: {', '.join(missing_columns)}.")
+
+    database = get_user_database(db_path)
+    database.ensure_catalog()
+    with database.connection() as conn:
+        row_count = 0
+        dataset_id = None
+        # All chunks are written in a single transaction, a failing chunk leaves no partial table
+        with conn:
+            conn.execute("BEGIN;")
+            conn.execute(f'DROP TABLE IF EXISTS "{table_name}";')
+            conn.execute(f'CREATE TABLE "{table_name}" ({column_definitions});')
+            for chunk in iter_upload_chunks(file, chunksize, columns):
+                chunk = to_template_types(chunk, template_df)
+                if not validate_chunk(chunk, template_df):
+                    raise TemplateMismatchError(f"Rows {row_count + 1} to {row_count + len(chunk)} do not match the template structure.")
+                values = chunk.astype(object).where(chunk.notna(), None)
+                conn.executemany(
+                    f'INSERT INTO "{table_name}" VALUES ({placeholders});',
+                    values.itertuples(index=False, name=None)
+                )
+                row_count += len(chunk)
+                if progress_callback is not None:
+                    progress_callback(row_count)
+
+            if row_count == 0:
+                raise ValueError("The uploaded file is empty.")
+
+            # Catalog the table in the same transaction that filled it
+            if content_hash is not None:
+                dataset_id = database.register_dataset(conn, content_hash, table_name, file.name, row_count)
+
+    return row_count, dataset_id
+
+
+# Uploads are ingested by a small pool of background threads, so the Data page script never
+# waits on parsing. Jobs for the same database run one at a time, so two jobs never pick the
+# same table name, while uploads of different users proceed side by side
+INGEST_WORKERS = 4
+
+# Finished jobs are kept this many seconds for the pages polling them, then dropped
+FINISHED_JOB_SECONDS = 300
+
+_ingestion_workers = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix='upload-ingestion')
+_jobs = {}
+_jobs_lock = threading.Lock()
+_database_locks = {}
+
+
+def submit_ingestion(content, file_name, db_path, username, template_df, content_hash):
+    # Reruns and other sessions submitting the same file to the same database share one job. A
+    # failed or rejected job is not reused, submitting the file again retries it
+    with _jobs_lock:
+        _prune_jobs()
+        for job in _jobs.values():
+            if job['db_path'] == db_path and job['content_hash'] == content_hash and job['state'] in ('queued', 'running', 'done'):
+                return job['id']
+        job_id = uuid4().hex[:12]
+        _jobs[job_id] = {
+            'id': job_id, 'db_path': db_path, 'content_hash': content_hash, 'file_name': file_name,
+            'state': 'queued', 'rows': 0, 'progress': 0.0, 'dataset_id': None, 'table_name': None, 'error': None,
+            'finished_at': None,
+        }
+        database_lock = _database_locks.setdefault(db_path, threading.Lock())
+    _ingestion_workers.submit(_run_ingestion, job_id, content, username, template_df, database_lock)
+    return job_id
+
+
+def _prune_jobs():
+    # Called with _jobs_lock held
+    cutoff = time.monotonic() - FINISHED_JOB_SECONDS
+    for job_id in [job_id for job_id, job in _jobs.items() if job['finished_at'] is not None and job['finished_at'] < cutoff]:
+        del _jobs[job_id]
+
+
+def get_ingestion_job(job_id):
+    # A snapshot of the job, safe to read while the worker updates it
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job is not None else None
+
+
+def _update_job(job_id, **fields):
+    with _jobs_lock:
+        if fields.get('state') in ('done', 'rejected', 'failed'):
+            fields['finished_at'] = time.monotonic()
+        _jobs[job_id].update(fields)
+
+
+def _run_ingestion(job_id, content, username, template_df, database_lock):
+    with database_lock:
+        _ingest_job(job_id, content, username, template_df)
+
+
+def _ingest_job(job_id, content, username, template_df):
+    job = get_ingestion_job(job_id)
+    db_path, content_hash = job['db_path'], job['content_hash']
+    file = BytesIO(content)
+    file.name = job['file_name']
+    database = get_user_database(db_path)
+    try:
+        # The same file may have been ingested while this job was queued
+        previous_upload = database.find_dataset(content_hash)
+        if previous_upload is not None:
+            dataset_id, table_name = previous_upload
+            state = 'done' if table_name is not None else 'rejected'
+            _update_job(job_id, state=state, progress=1.0, dataset_id=dataset_id, table_name=table_name)
+            return
+
+        table_name = next_table_name(db_path, username)
+        total_rows = estimate_rows(file)
+        _update_job(job_id, state='running', table_name=table_name)
+
+        def report_progress(rows):
+            progress = min(rows / total_rows, 1.0) if total_rows else 0.0
+            _update_job(job_id, rows=rows, progress=progress)
+
+        _, dataset_id = ingest_upload(file, db_path, table_name, template_df, content_hash=content_hash,
+                                      progress_callback=report_progress)
+        _update_job(job_id, state='done', progress=1.0, dataset_id=dataset_id)
+    except TemplateMismatchError as e:
+        database.record_rejected(content_hash, file.name)
+        _update_job(job_id, state='rejected', table_name=None, error=str(e))
+    except Exception as e:
+        _update_job(job_id, state='failed', table_name=None, error=str(e))
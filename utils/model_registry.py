@@ -0,0 +1,183 @@
+import os
+import sys
+import logging
+import threading
+from collections import OrderedDict
+import joblib
+from utils.scoring import make_record_scorer
+
+logger = logging.getLogger(__name__)
+
+# Model artifacts available on the prediction page, keyed by their selectbox label
+MODEL_PATHS = {
+    'Random Forest': './models/RF.joblib',
+    'GBoost': './models/GB.joblib',
+    'XGBoost': './models/XB.joblib',
+}
+ENCODER_PATH = './models/encoder.joblib'
+
+# Residency limits for loaded pipelines
+MAX_RESIDENT_MODELS = 2
+MEMORY_BUDGET_BYTES = 512 * 1024 * 1024
+
+# Set CHURN_MODELS_MMAP_MODE=r to load the NumPy arrays of the models as read-only memory maps,
+# so Streamlit processes on the same host read them from one page-cache copy
+MMAP_MODE = os.environ.get('CHURN_MODELS_MMAP_MODE') or None
+MMAP_DIR = './models/mmap'
+
+
+def export_mmap_artifact(source_path, mmap_dir=MMAP_DIR):
+    # Re-dump uncompressed so joblib can map every array straight from the file,
+    # writing to a temporary name first so concurrent processes never see a partial file
+    os.makedirs(mmap_dir, exist_ok=True)
+    target_path = os.path.join(mmap_dir, os.path.basename(source_path))
+    tmp_path = f"{target_path}.{os.getpid()}.tmp"
+    joblib.dump(joblib.load(source_path), tmp_path, compress=0)
+    os.replace(tmp_path, target_path)
+    return target_path
+
+
+def process_memory():
+    # Resident memory of this process in bytes. On Linux it is split into private (anonymous)
+    # pages and file-backed pages, which is where memory-mapped model arrays are counted. Where
+    # /proc is not available only the peak resident size is known, it is reported as rss_peak
+    memory = {'pid': os.getpid(), 'rss': None, 'rss_anon': None, 'rss_file': None, 'rss_peak': None}
+    fields = {'VmRSS': 'rss', 'RssAnon': 'rss_anon', 'RssFile': 'rss_file'}
+    try:
+        with open('/proc/self/status', 'r', encoding='utf-8') as file:
+            for line in file:
+                key, _, value = line.partition(':')
+                if key in fields:
+                    memory[fields[key]] = int(value.split()[0]) * 1024
+    except OSError:
+        import resource
+        # ru_maxrss is the peak resident size, in kilobytes on Linux and bytes on macOS
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        memory['rss_peak'] = max_rss if sys.platform == 'darwin' else max_rss * 1024
+    return memory
+
+
+class ModelRegistry:
+    def __init__(self, model_paths=MODEL_PATHS, encoder_path=ENCODER_PATH,
+                 max_models=MAX_RESIDENT_MODELS, memory_budget=MEMORY_BUDGET_BYTES,
+                 mmap_mode=MMAP_MODE, mmap_dir=MMAP_DIR):
+        self.model_paths = model_paths
+        self.encoder_path = encoder_path
+        self.max_models = max_models
+        self.memory_budget = memory_budget
+        self.mmap_mode = mmap_mode
+        self.mmap_dir = mmap_dir
+        self._models = OrderedDict()
+        self._encoder = None
+        # _lock guards the resident models, loads happen outside it under a lock per model
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._encoder_lock = threading.Lock()
+        memory = process_memory()
+        logger.info("Model registry started in pid %s: resident %s bytes, memory-mapped models %s",
+                    memory['pid'], memory['rss'] if memory['rss'] is not None else memory['rss_peak'],
+                    'on' if mmap_mode else 'off')
+
+    # Readers take _lock too, another session may load or evict a model while they iterate
+    def is_loaded(self, name):
+        with self._lock:
+            return name in self._models
+
+    def resident_bytes(self):
+        with self._lock:
+            return self._resident_bytes()
+
+    def _resident_bytes(self):
+        # Called with _lock held
+        return sum(entry['size'] for entry in self._models.values())
+
+    def get_encoder(self):
+        # The label encoder is shared by every model, load it once. It is loaded under its own lock,
+        # so requests for resident models do not wait on it
+        if self._encoder is None:
+            with self._encoder_lock:
+                if self._encoder is None:
+                    self._encoder = joblib.load(self.encoder_path)
+        return self._encoder
+
+    def _get_entry(self, name):
+        with self._lock:
+            entry = self._resident_entry(name)
+            if entry is not None:
+                return entry
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        # Each model loads under its own lock, outside the registry lock, so sessions using resident
+        # models are never held up by a load. Sessions asking for the same model wait for one load
+        with load_lock:
+            with self._lock:
+                entry = self._resident_entry(name)
+                if entry is not None:
+                    return entry
+            entry = self._load_entry(name)
+            with self._lock:
+                self._models[name] = entry
+                self._evict(keep=name)
+            return entry
+
+    def _resident_entry(self, name):
+        # Called with _lock held, marks a resident model as most recently used
+        entry = self._models.get(name)
+        if entry is not None:
+            self._models.move_to_end(name)
+        return entry
+
+    def _load_entry(self, name):
+        path = self.model_paths[name]
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Model file '{path}' for {name} was not found.")
+        load_path = self._mmap_path(path) if self.mmap_mode else path
+
+        before = process_memory()['rss_anon']
+        pipeline = joblib.load(load_path, mmap_mode=self.mmap_mode)
+        after = process_memory()['rss_anon']
+
+        # Only private memory counts against the budget, so the budget is enforced approximately.
+        # Fully loaded models are charged their joblib dump's size on disk from os.path.getsize,
+        # which leaves out the overhead of the unpickled Python objects. Mapped models are charged
+        # the private pages the process gained during the load, which also counts concurrent loads
+        if self.mmap_mode and before is not None and after is not None:
+            size = max(after - before, 0)
+        else:
+            size = os.path.getsize(load_path)
+
+        return {'pipeline': pipeline, 'size': size, 'mmap': bool(self.mmap_mode), 'record_scorer': None}
+
+    def _mmap_path(self, path):
+        # Export the artifact for memory mapping the first time, or again when the source changed
+        mmap_path = os.path.join(self.mmap_dir, os.path.basename(path))
+        if not os.path.exists(mmap_path) or os.path.getmtime(mmap_path) < os.path.getmtime(path):
+            mmap_path = export_mmap_artifact(path, self.mmap_dir)
+        return mmap_path
+
+    def memory_report(self):
+        report = process_memory()
+        with self._lock:
+            report['models'] = {name: {'size': entry['size'], 'mmap': entry['mmap']} for name, entry in self._models.items()}
+        return report
+
+    def _evict(self, keep):
+        # Drop least recently used models until both the count and memory limits hold,
+        # never evicting the model that was just requested
+        while len(self._models) > 1 and (
+            len(self._models) > self.max_models or self._resident_bytes() > self.memory_budget
+        ):
+            oldest = next(iter(self._models))
+            if oldest == keep:
+                break
+            del self._models[oldest]
+
+    def get_model(self, name):
+        return self._get_entry(name)['pipeline']
+
+    def get_record_scorer(self, name):
+        # Compiled scorers live with their model so eviction releases both
+        entry = self._get_entry(name)
+        if entry['record_scorer'] is None:
+            entry['record_scorer'] = make_record_scorer(entry['pipeline'])
+        return entry['record_scorer']
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+NUMERIC_QUANTILES = [0.0, 0.25, 0.5, 0.75, 1.0]
+
+
+def profile_numeric(df):
+    # Same rows as df.describe().T, one pass and one partial sort per column
+    rows = {}
+    for column in df.select_dtypes(include='number').columns:
+        values = df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+        values = values[~np.isnan(values)]
+        count = len(values)
+        if count:
+            minimum, q1, median, q3, maximum = np.quantile(values, NUMERIC_QUANTILES)
+            mean = values.mean()
+            std = values.std(ddof=1) if count > 1 else np.nan
+        else:
+            minimum = q1 = median = q3 = maximum = mean = std = np.nan
+        rows[column] = [float(count), mean, std, minimum, q1, median, q3, maximum]
+    summary = pd.DataFrame.from_dict(
+        rows, orient='index', columns=['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max']
+    )
+    summary.index.name = 'Feature'
+    return summary
+
+
+def profile_categorical(df):
+    # count, unique, top and freq from a single factorize pass per column
+    rows = {}
+    for column in df.select_dtypes(include=['object', 'category']).columns:
+        codes, uniques = pd.factorize(df[column])
+        present = codes[codes >= 0]
+        if len(present):
+            counts = np.bincount(present, minlength=len(uniques))
+            freq = counts.max()
+            # Ties go to the smallest value, as with df.mode()
+            tied = pd.Series(uniques[np.flatnonzero(counts == freq)])
+            top = tied.sort_values().iloc[0]
+        else:
+            top, freq = np.nan, np.nan
+        rows[column] = [len(present), len(uniques), top, freq]
+    summary = pd.DataFrame.from_dict(rows, orient='index', columns=['count', 'unique', 'top', 'freq'], dtype=object)
+    summary.index.name = 'Feature'
+    return summary
+
+
+def profile_dataset(df):
+    return profile_numeric(df), profile_categorical(df)
@@ -0,0 +1,135 @@
+import os
+import importlib.util
+import pandas as pd
+from openpyxl import load_workbook
+
+# calamine parses .xlsx natively and is several times faster than openpyxl. It is used when
+# python-calamine is installed, set CHURN_EXCEL_ENGINE=openpyxl to force the pure Python reader
+EXCEL_ENGINE = os.environ.get('CHURN_EXCEL_ENGINE') or (
+    'calamine' if importlib.util.find_spec('python_calamine') else 'openpyxl'
+)
+
+
+def to_numeric_or_keep(series):
+    # Same as pd.to_numeric(errors='ignore'), which is deprecated in recent pandas
+    try:
+        return pd.to_numeric(series)
+    except (ValueError, TypeError):
+        return series
+
+
+def read_header(file):
+    # Column names only, without parsing the data rows
+    file.seek(0)  # Reset file pointer to the start
+    if file.name.endswith('.csv'):
+        columns = pd.read_csv(file, nrows=0).columns
+    elif file.name.endswith('.xlsx'):
+        # A read-only workbook stops after the first row, other engines would load the whole sheet
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        try:
+            columns = next(workbook.worksheets[0].iter_rows(max_row=1, values_only=True), ())
+        finally:
+            workbook.close()
+    else:
+        raise ValueError(f"Unsupported file type: {file.name}")
+    file.seek(0)
+    return list(columns)
+
+
+def read_excel(file, columns=None, engine=EXCEL_ENGINE):
+    # First sheet, limited to the given columns when there are any
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    return pd.read_excel(file, usecols=columns, engine=engine)
+
+
+def read_upload(file, columns=None):
+    file.seek(0)  # Reset file pointer to the start
+    if file.name.endswith('.csv'):
+        return pd.read_csv(file, usecols=columns)
+    elif file.name.endswith('.xlsx'):
+        return read_excel(file, columns)
+    raise ValueError(f"Unsupported file type: {file.name}")
+
+
+def _iter_row_chunks(rows, chunksize, columns=None):
+    # Group an iterator of sheet rows, header first, into frames of at most chunksize rows
+    header = next(rows, None)
+    if header is None:
+        return
+    header = list(header)
+    positions = [header.index(column) for column in columns] if columns else range(len(header))
+    names = [header[i] for i in positions]
+    batch = []
+    for row in rows:
+        batch.append([row[i] if i < len(row) else None for i in positions])
+        if len(batch) == chunksize:
+            yield pd.DataFrame(batch, columns=names)
+            batch = []
+    if batch:
+        yield pd.DataFrame(batch, columns=names)
+
+
+def _iter_openpyxl_chunks(file, chunksize, columns=None):
+    # Read-only openpyxl streams rows from the sheet instead of building the whole workbook
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        yield from _iter_row_chunks(workbook.worksheets[0].iter_rows(values_only=True), chunksize, columns)
+    finally:
+        workbook.close()
+
+
+def _calamine_cell(value):
+    # Match pandas' calamine reader: empty cells are missing and whole floats become integers
+    if value == '':
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _iter_calamine_chunks(file, chunksize, columns=None):
+    # calamine holds the parsed sheet in its compact native form, rows are turned into Python
+    # objects one chunk at a time instead of building a frame of the whole sheet
+    from python_calamine import CalamineWorkbook
+    workbook = CalamineWorkbook.from_filelike(file)
+    try:
+        sheet = workbook.get_sheet_by_index(0)
+        rows = ([_calamine_cell(value) for value in row] for row in sheet.iter_rows())
+        yield from _iter_row_chunks(rows, chunksize, columns)
+    finally:
+        workbook.close()
+
+
+def iter_excel_chunks(file, chunksize, columns=None, engine=EXCEL_ENGINE):
+    # Rows are read chunk by chunk with both supported engines, never as a frame of the whole sheet
+    file.seek(0)
+    if engine == 'calamine':
+        yield from _iter_calamine_chunks(file, chunksize, columns)
+    elif engine == 'openpyxl':
+        yield from _iter_openpyxl_chunks(file, chunksize, columns)
+    else:
+        raise ValueError(f"Unsupported Excel engine: {engine}")
+
+
+def iter_upload_chunks(file, chunksize, columns=None):
+    file.seek(0)  # Reset file pointer to the start
+    if file.name.endswith('.csv'):
+        yield from pd.read_csv(file, chunksize=chunksize, usecols=columns)
+    elif file.name.endswith('.xlsx'):
+        yield from iter_excel_chunks(file, chunksize, columns)
+    else:
+        raise ValueError(f"Unsupported file type: {file.name}")
+
+
+def to_template_types(df, template_df):
+    # Put the columns in template order and convert only the columns the template holds as numbers,
+    # text columns are kept as read instead of attempting a numeric parse on each of them
+    df = df[list(template_df.columns)]
+    numeric_columns = [
+        column for column in template_df.columns
+        if pd.api.types.is_numeric_dtype(template_df[column]) and not pd.api.types.is_numeric_dtype(df[column])
+    ]
+    if numeric_columns:
+        df = df.assign(**{column: to_numeric_or_keep(df[column]) for column in numeric_columns})
+    return df
@@ -0,0 +1,45 @@
+import pandas as pd
+
+# Bump when the declared dtypes change, so typed frames cached on disk are rebuilt
+SCHEMA_REVISION = 1
+
+# Text fields of the template, held as categoricals. With this few distinct values their codes are
+# int8, which covers the Yes/No flags while keeping their labels for display and the models
+CATEGORICAL_COLUMNS = [
+    'Gender', 'SeniorCitizen', 'Partner', 'Dependents', 'PhoneService', 'MultipleLines', 'InternetService',
+    'OnlineSecurity', 'OnlineBackup', 'DeviceProtection', 'TechSupport', 'StreamingTV', 'StreamingMovies',
+    'Contract', 'PaperlessBilling', 'PaymentMethod', 'Churn'
+]
+
+# Tenure and the charges, float32 leaves room for the missing values that are imputed later
+FLOAT_COLUMNS = ['Tenure', 'MonthlyCharges', 'TotalCharges', 'AvgMonthlyCharges', 'MonthlyChargesToTotalChargesRatio']
+
+# customerID is left as text, it is unique per row
+TEMPLATE_SCHEMA = {
+    **{column: 'category' for column in CATEGORICAL_COLUMNS},
+    **{column: 'float32' for column in FLOAT_COLUMNS},
+}
+
+# Batch scoring input. The numeric columns stay float64 there: the pipelines quantile-transform
+# them, and float32 charges moved some predicted probabilities by as much as 0.17
+MODEL_INPUT_SCHEMA = {column: 'category' for column in CATEGORICAL_COLUMNS}
+
+
+def declared_dtype(column, schema=TEMPLATE_SCHEMA):
+    # Names are matched regardless of case, the model inputs spell gender and tenure in lower case
+    return {name.lower(): dtype for name, dtype in schema.items()}.get(column.lower())
+
+
+def apply_schema(df, schema=TEMPLATE_SCHEMA):
+    # Convert the declared columns, numbers that do not parse become missing values. Columns the
+    # schema does not know, and columns already in their declared dtype, are left as they are
+    converted = {}
+    for column in df.columns:
+        dtype = declared_dtype(column, schema)
+        if dtype is None or df[column].dtype == dtype:
+            continue
+        if dtype == 'category':
+            converted[column] = df[column].astype('category')
+        else:
+            converted[column] = pd.to_numeric(df[column], errors='coerce').astype(dtype)
+    return df.assign(**converted) if converted else df
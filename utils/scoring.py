@@ -0,0 +1,136 @@
+import time
+import warnings
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn import config_context
+from sklearn.compose import ColumnTransformer
+from utils.schema import MODEL_INPUT_SCHEMA, apply_schema
+
+# Number of rows handed to the model per predict_proba call on the batch path
+BATCH_CHUNK_SIZE = 20000
+
+
+def prepare_batch(df):
+    # Drop the identifier column, the pipeline was not trained on it
+    df = df.drop(columns=['customerID'], errors='ignore')
+
+    # Text fields become categoricals, which the pipelines encode the same way as the strings
+    df = apply_schema(df, MODEL_INPUT_SCHEMA)
+
+    # Convert 'TotalCharges' to numeric, coercing errors to NaN
+    total_charges = pd.to_numeric(df['TotalCharges'], errors='coerce')
+
+    # Ensure 'tenure' and 'TotalCharges' have no zero values, in a single assignment
+    df = df.assign(
+        tenure=df['tenure'].replace(0, 1),
+        TotalCharges=total_charges.replace(0, 1)
+    )
+    return df
+
+
+def _unwrap_pipeline(pipeline):
+    # Hyperparameter searches keep the refitted pipeline on best_estimator_
+    return getattr(pipeline, 'best_estimator_', pipeline)
+
+
+def _split_pipeline(pipeline):
+    # The fitted ColumnTransformer -> ... -> classifier stages of a pipeline, or None when it has
+    # another layout. Samplers such as SMOTE only act during fit and are skipped at prediction time
+    steps = getattr(_unwrap_pipeline(pipeline), 'steps', None)
+    preprocessor = steps[0][1] if steps else None
+    if not isinstance(preprocessor, ColumnTransformer):
+        return None
+    middle_steps = [step for _, step in steps[1:-1] if not hasattr(step, 'fit_resample') and step != 'passthrough']
+    return preprocessor, middle_steps, steps[-1][1]
+
+
+def score_batch(pipeline, df, chunk_size=BATCH_CHUNK_SIZE, progress_callback=None):
+    n_rows = len(df)
+    classes = np.asarray(pipeline.classes_)
+    probabilities = np.empty((n_rows, len(classes)), dtype=np.float64)
+    if not n_rows:
+        return classes[:0], probabilities, 0.0
+
+    start_time = time.perf_counter()
+    stages = _split_pipeline(pipeline)
+    if stages is None:
+        # Without the known layout the whole frame goes through the pipeline in one pass
+        probabilities[:] = pipeline.predict_proba(df)
+        if progress_callback is not None:
+            progress_callback(1.0)
+    else:
+        # The numeric branch quantile-transforms against the rows it is given, so the preprocessor
+        # sees the whole frame once and only the classifier runs chunk by chunk
+        preprocessor, middle_steps, model = stages
+        features = preprocessor.transform(df)
+        for step in middle_steps:
+            features = step.transform(features)
+        for start in range(0, n_rows, chunk_size):
+            stop = min(start + chunk_size, n_rows)
+            # One predict_proba pass per chunk, the label is derived from it below
+            probabilities[start:stop] = model.predict_proba(features[start:stop])
+            if progress_callback is not None:
+                progress_callback(stop / n_rows)
+    elapsed = time.perf_counter() - start_time
+
+    # Same decision rule as predict(): the class with the highest probability
+    predictions = classes.take(probabilities.argmax(axis=1))
+    rows_per_second = n_rows / elapsed if elapsed > 0 else float('inf')
+
+    return predictions, probabilities, rows_per_second
+
+
+def make_record_scorer(pipeline):
+    feature_names = list(getattr(pipeline, 'feature_names_in_', []))
+    stages = _split_pipeline(pipeline)
+
+    # Fall back to a one-row DataFrame when the pipeline layout is not the fitted
+    # ColumnTransformer -> ... -> classifier shape the fast path relies on
+    if not feature_names or stages is None:
+        def score_record_frame(record):
+            probabilities = pipeline.predict_proba(pd.DataFrame([record], columns=feature_names or None))[0]
+            return pipeline.classes_[probabilities.argmax()], probabilities
+        return score_record_frame
+
+    preprocessor, middle_steps, model = stages
+
+    # Resolve each fitted column transformer to column positions in the feature vector
+    positions = {name: i for i, name in enumerate(feature_names)}
+    branches = []
+    for name, transformer, columns in preprocessor.transformers_:
+        if transformer == 'drop' or len(columns) == 0:
+            continue
+        branches.append((transformer, [positions[column] for column in columns]))
+
+    classes = np.asarray(pipeline.classes_)
+
+    def score_record(record):
+        # The scorer is shared by every session through the model registry, so each call fills
+        # its own feature vector, in fitted column order
+        row = np.empty((1, len(feature_names)), dtype=object)
+        for i, name in enumerate(feature_names):
+            row[0, i] = record[name]
+
+        with warnings.catch_warnings(), config_context(assume_finite=True):
+            # Transformers were fitted on named columns, positional input is intentional here
+            warnings.filterwarnings('ignore', message='X does not have valid feature names')
+            blocks = []
+            for transformer, columns in branches:
+                block = row[:, columns]
+                if transformer != 'passthrough':
+                    block = transformer.transform(block)
+                blocks.append(block)
+
+            if preprocessor.sparse_output_:
+                features = sparse.hstack([sparse.csr_matrix(block) for block in blocks]).tocsr()
+            else:
+                features = np.hstack([block.toarray() if sparse.issparse(block) else block for block in blocks])
+
+            for step in middle_steps:
+                features = step.transform(features)
+            probabilities = model.predict_proba(features)[0]
+
+        return classes[probabilities.argmax()], probabilities
+
+    return score_record
@@ -0,0 +1,191 @@
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+import pandas as pd
+
+USER_DATA_DIR = './data'
+
+# Idle connections kept open per user database
+POOL_SIZE = 4
+
+# Compiled statements kept per connection, reused whenever the same SQL text runs again
+STATEMENT_CACHE_SIZE = 256
+
+# Catalog of the datasets in each user database. It replaces the earlier uploads registry, which
+# is migrated into it, and takes over dataset tables written before either existed
+CATALOG_TABLE = 'datasets'
+LEGACY_UPLOADS_TABLE = 'uploads'
+
+# Version of the template column layout dataset tables are written with, 0 marks legacy tables
+SCHEMA_VERSION = 1
+
+# Millisecond timestamps, so that datasets activated within the same second still order correctly
+NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+
+def user_db_path(username):
+    # Ensure the directory exists
+    save_dir = os.path.join(USER_DATA_DIR, username)
+    os.makedirs(save_dir, exist_ok=True)
+    return os.path.join(save_dir, f"{username}.db")
+
+
+class UserDatabase:
+    def __init__(self, db_path, pool_size=POOL_SIZE):
+        self.db_path = db_path
+        self.pool_size = pool_size
+        self._idle = []
+        self._lock = threading.Lock()
+        self._tables = None
+        self._catalog_ready = False
+
+    def _connect(self):
+        # Connections move between the script threads of different sessions and the ingestion worker
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        # WAL lets the pages read while an upload is being written
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            # Never hand out a connection with a transaction left open
+            if conn.in_transaction:
+                conn.rollback()
+            with self._lock:
+                if len(self._idle) < self.pool_size:
+                    self._idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    def tables(self):
+        # Table names, listed again only when the schema version shows tables were added or dropped
+        with self.connection() as conn:
+            version = conn.execute("PRAGMA schema_version;").fetchone()[0]
+            cached = self._tables
+            if cached is None or cached[0] != version:
+                names = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table';")]
+                cached = self._tables = (version, names)
+        return cached[1]
+
+    def ensure_catalog(self):
+        # Writers call this before opening their own transaction, it needs a write lock of its own
+        if self._catalog_ready:
+            return
+        with self.connection() as conn:
+            with conn:
+                # A NULL table_name records a file that was rejected, so it is not parsed again either
+                conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {CATALOG_TABLE} (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, content_hash TEXT UNIQUE, table_name TEXT,
+                    file_name TEXT, row_count INTEGER, schema_version INTEGER, uploaded_at TEXT
+                );
+                """)
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{CATALOG_TABLE}_uploaded ON {CATALOG_TABLE} (uploaded_at);")
+                tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table';")}
+
+                if LEGACY_UPLOADS_TABLE in tables:
+                    conn.execute(f"""
+                    INSERT OR IGNORE INTO {CATALOG_TABLE} (content_hash, table_name, file_name, row_count, schema_version, uploaded_at)
+                    SELECT content_hash, table_name, file_name, row_count, CASE WHEN table_name IS NULL THEN NULL ELSE 1 END, uploaded_at
+                    FROM {LEGACY_UPLOADS_TABLE} ORDER BY uploaded_at;
+                    """)
+                    conn.execute(f"DROP TABLE {LEGACY_UPLOADS_TABLE};")
+                    tables.discard(LEGACY_UPLOADS_TABLE)
+
+                # Tables from before the catalog are added in the numeric order of their names
+                catalogued = {row[0] for row in conn.execute(f"SELECT table_name FROM {CATALOG_TABLE} WHERE table_name IS NOT NULL;")}
+                legacy_tables = sorted(
+                    (table for table in tables - catalogued if table != CATALOG_TABLE and not table.startswith('sqlite_')),
+                    key=_natural_key
+                )
+                for table in legacy_tables:
+                    row_count = conn.execute(f'SELECT COUNT(*) FROM "{table}";').fetchone()[0]
+                    conn.execute(
+                        f"INSERT INTO {CATALOG_TABLE} (table_name, row_count, schema_version) VALUES (?, ?, 0);",
+                        (table, row_count)
+                    )
+        self._catalog_ready = True
+
+    def find_dataset(self, content_hash):
+        # Returns (id, table_name) for a file seen before, None for a new one
+        self.ensure_catalog()
+        with self.connection() as conn:
+            return conn.execute(
+                f"SELECT id, table_name FROM {CATALOG_TABLE} WHERE content_hash = ?;", (content_hash,)
+            ).fetchone()
+
+    def register_dataset(self, conn, content_hash, table_name, file_name, row_count):
+        # Called inside the transaction that filled the table, which becomes the active dataset
+        conn.execute(f"""
+        INSERT INTO {CATALOG_TABLE} (content_hash, table_name, file_name, row_count, schema_version, uploaded_at)
+        VALUES (?, ?, ?, ?, ?, {NOW})
+        ON CONFLICT (content_hash) DO UPDATE SET
+            table_name = excluded.table_name, file_name = excluded.file_name, row_count = excluded.row_count,
+            schema_version = excluded.schema_version, uploaded_at = excluded.uploaded_at;
+        """, (content_hash, table_name, file_name, row_count, SCHEMA_VERSION))
+        return conn.execute(f"SELECT id FROM {CATALOG_TABLE} WHERE content_hash = ?;", (content_hash,)).fetchone()[0]
+
+    def record_rejected(self, content_hash, file_name):
+        self.ensure_catalog()
+        with self.connection() as conn:
+            with conn:
+                conn.execute(
+                    f"INSERT OR IGNORE INTO {CATALOG_TABLE} (content_hash, file_name, uploaded_at) VALUES (?, ?, {NOW});",
+                    (content_hash, file_name)
+                )
+
+    def activate_dataset(self, dataset_id):
+        # Uploading a known file again makes its dataset the active one
+        self.ensure_catalog()
+        with self.connection() as conn:
+            with conn:
+                conn.execute(f"UPDATE {CATALOG_TABLE} SET uploaded_at = {NOW} WHERE id = ?;", (dataset_id,))
+
+    def latest_dataset(self):
+        # Returns (id, table_name) of the most recently uploaded dataset, legacy tables order by id
+        self.ensure_catalog()
+        with self.connection() as conn:
+            return conn.execute(f"""
+            SELECT id, table_name FROM {CATALOG_TABLE} WHERE table_name IS NOT NULL
+            ORDER BY uploaded_at IS NULL, uploaded_at DESC, id DESC LIMIT 1;
+            """).fetchone()
+
+    def read_table(self, table_name):
+        with self.connection() as conn:
+            return pd.read_sql_query(f'SELECT * FROM "{table_name}";', conn)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+def get_user_database(db_path):
+    # One pool per database file, shared by every session and the ingestion worker
+    with _databases_lock:
+        database = _databases.get(db_path)
+        if database is None:
+            database = _databases[db_path] = UserDatabase(db_path)
+        return database
+
+
+def _natural_key(name):
+    # user_table9 sorts before user_table10
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', name)]